@@ -19,6 +19,7 @@
 
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import os
@@ -27,8 +28,11 @@ import threading
 import queue
 import sqlite3
 import hashlib
+import math
+import random
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlsplit
 import tempfile
 import wave
 import base64
@@ -50,6 +54,35 @@ CONFIG = {
     "data_dir": os.path.expanduser("~/radiax-customer-care/data"),
     "audio_dir": os.path.expanduser("~/radiax-customer-care/audio"),
     "log_dir": os.path.expanduser("~/radiax-customer-care/logs"),
+    # SQLite tuning (one connection per thread, WAL journal)
+    "db_busy_timeout": 5,  # seconds to wait on a locked database
+    "db_cache_mb": 16,
+    "db_mmap_mb": 64,
+    "db_cached_statements": 256,
+    # FAQ search: BM25 column weights (question, answer, keywords) and the
+    # minimum relevance for an FAQ answer to be used instead of the AI
+    "faq_weights": (4.0, 1.0, 8.0),
+    "faq_min_score": 3.0,
+    "faq_index_check_interval": 5,  # seconds between FAQ change-counter checks
+    # Optional JSON {"intent": ["keyword", ...]} replacing built-in intents by name
+    "intents_file": os.path.expanduser("~/radiax-customer-care/data/intents.json"),
+    # AI providers are hedged: the next one starts if no answer arrives
+    # within ai_hedge_delay, and a turn never waits past ai_latency_budget
+    "ai_hedge_delay": 1.5,
+    "ai_latency_budget": 8,
+    "ai_request_timeout": 20,  # read timeout
+    "ai_connect_timeout": 3,
+    "ai_connect_retries": 2,
+    "ai_retry_backoff": 0.25,  # seconds; full jitter, doubling per retry
+    "ai_pool_size": 8,  # keep-alive connections per provider host
+    # A provider that times out after at least this long counts as failed,
+    # even when the turn's budget set the timeout; sooner, it wasn't given a chance
+    "ai_min_judged_wait": 1.5,
+    # Provider routing: EWMA weight for new latency samples, and a provider
+    # is skipped for ai_breaker_cooldown seconds after that many failures in a row
+    "ai_latency_alpha": 0.3,
+    "ai_breaker_failures": 3,
+    "ai_breaker_cooldown": 60,
 }
 
 # Create directories
@@ -92,14 +125,246 @@ AI_APIS = [
 # DATABASE MANAGER
 # ═══════════════════════════════════════════════════════════════════
 
+def normalize_phone(phone):
+    """Canonical +254XXXXXXXXX form used as the customer lookup key"""
+    digits = re.sub(r"\D", "", phone or "")
+    if not digits:
+        return None
+    if digits.startswith("254"):
+        return "+" + digits
+    if digits.startswith("0") and len(digits) == 10:
+        return "+254" + digits[1:]
+    if len(digits) == 9 and digits[0] in "71":
+        return "+254" + digits
+    return "+" + digits if phone.strip().startswith("+") else digits
+
+
+def _merge_phone_duplicates(c):
+    """Fold customers whose numbers normalize alike into one row.
+
+    The row already keyed on the number (else the oldest) survives; the
+    others' tickets and call logs are moved onto it, blank fields are
+    filled from them, and they are deleted.
+    """
+    groups = {}
+    rows = c.execute("SELECT id, phone, phone_norm FROM customers ORDER BY id").fetchall()
+    for row_id, phone, phone_norm in rows:
+        norm = normalize_phone(phone)
+        if norm:
+            groups.setdefault(norm, []).append((phone_norm != norm, row_id))
+    
+    merged = 0
+    for norm, members in groups.items():
+        keep = min(members)[1]
+        extras = [row_id for _, row_id in members if row_id != keep]
+        if extras:
+            marks = ",".join("?" * len(extras))
+            c.execute(f"UPDATE tickets SET customer_id = ? WHERE customer_id IN ({marks})", [keep, *extras])
+            c.execute(f"UPDATE call_logs SET customer_id = ? WHERE customer_id IN ({marks})", [keep, *extras])
+            filled = c.execute(f"""
+                SELECT MAX(system_id), MAX(name), MAX(email), MAX(last_contact)
+                FROM customers WHERE id IN ({marks})
+            """, extras).fetchone()
+            c.execute(f"DELETE FROM customers WHERE id IN ({marks})", extras)
+            c.execute("""
+                UPDATE customers SET
+                    system_id = COALESCE(system_id, ?),
+                    name = COALESCE(name, ?),
+                    email = COALESCE(email, ?),
+                    last_contact = CASE WHEN ? > COALESCE(last_contact, '') THEN ? ELSE last_contact END
+                WHERE id = ?
+            """, [*filled, filled[3], keep])
+            merged += len(extras)
+        c.execute("""
+            UPDATE customers SET phone_norm = ?
+            WHERE id = ? AND NOT EXISTS (SELECT 1 FROM customers WHERE phone_norm = ?)
+        """, (norm, keep, norm))
+    
+    if merged:
+        print(f"⚠️ Merged {merged} duplicate customer record(s) that shared a phone number")
+
+
+def _migrate_lookup_indexes(c):
+    """Normalized phone key + indexes for the per-call lookups"""
+    c.execute("ALTER TABLE customers ADD COLUMN phone_norm TEXT")
+    # The unique index needs one row per number, so merge duplicates first
+    _merge_phone_duplicates(c)
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_phone_norm ON customers (phone_norm)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers (phone)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_customer ON tickets (customer_id, status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_call_logs_customer ON call_logs (customer_id)")
+
+
+DEFAULT_FAQS = [
+    ("What are your working hours?", "We are open from 8 AM to 10 PM, Monday to Sunday.", "general", "hours,open,time,working"),
+    ("How do I reset my password?", "To reset your password, go to our website and click 'Forgot Password', then enter your email.", "account", "password,reset,forgot,login"),
+    ("What payment methods do you accept?", "We accept M-Pesa, credit cards, and bank transfers.", "billing", "payment,pay,mpesa,card"),
+    ("How can I track my order?", "You can track your order using your System ID on our website or by calling us.", "orders", "track,order,delivery,shipping"),
+    ("How do I contact support?", "You can reach us via phone, WhatsApp, or email at support@radiax.co.ke", "support", "contact,support,help,reach"),
+]
+
+
+def _migrate_faq_unique(c):
+    """Drop the duplicate FAQs earlier startups seeded, then key on question"""
+    c.execute("""
+        DELETE FROM faq WHERE id NOT IN (
+            SELECT MIN(id) FROM faq GROUP BY TRIM(question) COLLATE NOCASE
+        )
+    """)
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_faq_question ON faq (TRIM(question) COLLATE NOCASE)")
+
+
+def _seed_default_faqs(c):
+    """Default FAQs, inserted once"""
+    c.executemany(
+        "INSERT OR IGNORE INTO faq (question, answer, category, keywords) VALUES (?, ?, ?, ?)",
+        DEFAULT_FAQS
+    )
+
+
+def _migrate_faq_fts(c):
+    """FTS5 index over the FAQ, kept in step with the table by triggers.
+
+    Skipped when this SQLite build has no FTS5; search_faq then scans.
+    """
+    try:
+        c.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS faq_fts USING fts5(
+                question, answer, keywords,
+                content='faq', content_rowid='id',
+                tokenize='porter unicode61'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        print(f"⚠️ SQLite {sqlite3.sqlite_version} has no FTS5; FAQ search will scan the table")
+        return
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS faq_fts_insert AFTER INSERT ON faq BEGIN
+            INSERT INTO faq_fts (rowid, question, answer, keywords)
+            VALUES (new.id, new.question, new.answer, new.keywords);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS faq_fts_delete AFTER DELETE ON faq BEGIN
+            INSERT INTO faq_fts (faq_fts, rowid, question, answer, keywords)
+            VALUES ('delete', old.id, old.question, old.answer, old.keywords);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS faq_fts_update AFTER UPDATE ON faq BEGIN
+            INSERT INTO faq_fts (faq_fts, rowid, question, answer, keywords)
+            VALUES ('delete', old.id, old.question, old.answer, old.keywords);
+            INSERT INTO faq_fts (rowid, question, answer, keywords)
+            VALUES (new.id, new.question, new.answer, new.keywords);
+        END
+    """)
+    c.execute("INSERT INTO faq_fts (faq_fts) VALUES ('rebuild')")
+
+
+def _migrate_faq_change_counter(c):
+    """Counter bumped on every FAQ write, so cached copies know to reload"""
+    c.execute("CREATE TABLE IF NOT EXISTS faq_changes (id INTEGER PRIMARY KEY CHECK (id = 1), counter INTEGER NOT NULL)")
+    c.execute("INSERT OR IGNORE INTO faq_changes (id, counter) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS faq_changes_{event.lower()} AFTER {event} ON faq BEGIN
+                UPDATE faq_changes SET counter = counter + 1 WHERE id = 1;
+            END
+        """)
+
+
+def _migrate_intent_keywords(c):
+    """Extra intent keywords managed in the database"""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS intent_keywords (
+            intent TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            UNIQUE (intent, keyword)
+        )
+    """)
+
+
+# Applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    _migrate_lookup_indexes,
+    _migrate_faq_unique,
+    _seed_default_faqs,
+    _migrate_faq_fts,
+    _migrate_faq_change_counter,
+    _migrate_intent_keywords,
+    # Databases migrated before duplicates were merged left them unkeyed
+    _merge_phone_duplicates,
+]
+
+# Words too common in questions to say anything about which FAQ is meant
+FAQ_STOPWORDS = {
+    "a", "an", "and", "are", "can", "could", "do", "does", "for", "hello",
+    "hi", "how", "i", "in", "is", "it", "me", "my", "of", "on", "please",
+    "the", "to", "want", "what", "when", "where", "which", "with", "you", "your",
+}
+
+
+def faq_terms(text):
+    """Lower-cased word tokens of a query, minus stopwords"""
+    return [w for w in re.findall(r"\w+", text.lower()) if w not in FAQ_STOPWORDS]
+
+
 class Database:
     def __init__(self):
         self.db_path = os.path.join(CONFIG["data_dir"], "customers.db")
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
         self.init_db()
     
+    def connection(self):
+        """This thread's connection (opened once, then reused)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=CONFIG["db_busy_timeout"],
+                cached_statements=CONFIG["db_cached_statements"],
+            )
+            # WAL lets readers run alongside a writer; NORMAL is durable in WAL mode
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA cache_size = -{CONFIG['db_cache_mb'] * 1024}")
+            conn.execute(f"PRAGMA mmap_size = {CONFIG['db_mmap_mb'] * 1024 * 1024}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close_thread_connection(self):
+        """Close this thread's connection, for threads that are about to exit"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+    
+    def close(self):
+        """Close every thread's connection"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    pass  # owned by another thread; closed when it exits
+            self._connections = []
+        self._local = threading.local()
+    
     def init_db(self):
         """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         c = conn.cursor()
         
         # Customers table
@@ -159,38 +424,45 @@ class Database:
             )
         ''')
         
-        # Insert default FAQs
-        default_faqs = [
-            ("What are your working hours?", "We are open from 8 AM to 10 PM, Monday to Sunday.", "general", "hours,open,time,working"),
-            ("How do I reset my password?", "To reset your password, go to our website and click 'Forgot Password', then enter your email.", "account", "password,reset,forgot,login"),
-            ("What payment methods do you accept?", "We accept M-Pesa, credit cards, and bank transfers.", "billing", "payment,pay,mpesa,card"),
-            ("How can I track my order?", "You can track your order using your System ID on our website or by calling us.", "orders", "track,order,delivery,shipping"),
-            ("How do I contact support?", "You can reach us via phone, WhatsApp, or email at support@radiax.co.ke", "support", "contact,support,help,reach"),
-        ]
-        
-        for faq in default_faqs:
-            try:
-                c.execute("INSERT OR IGNORE INTO faq (question, answer, category, keywords) VALUES (?, ?, ?, ?)", faq)
-            except:
-                pass
-        
         conn.commit()
-        conn.close()
+        self.migrate()
+        self.has_fts = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'faq_fts'").fetchone() is not None
+    
+    def schema_version(self):
+        """Number of migrations applied to this database"""
+        return self.connection().execute("PRAGMA user_version").fetchone()[0]
+    
+    def migrate(self):
+        """Apply pending MIGRATIONS, each in its own transaction"""
+        conn = self.connection()
+        version = self.schema_version()
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            c = conn.cursor()
+            try:
+                c.execute("BEGIN IMMEDIATE")
+                # Another process may have migrated while we waited for the lock
+                if c.execute("PRAGMA user_version").fetchone()[0] >= number:
+                    conn.rollback()
+                    continue
+                migration(c)
+                c.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
     
     def get_customer(self, system_id=None, phone=None):
         """Get customer by system_id or phone"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        c = self.connection().cursor()
         
         if system_id:
             c.execute("SELECT * FROM customers WHERE system_id = ?", (system_id,))
         elif phone:
-            c.execute("SELECT * FROM customers WHERE phone = ?", (phone,))
+            c.execute("SELECT * FROM customers WHERE phone_norm = ?", (normalize_phone(phone),))
         else:
             return None
         
         row = c.fetchone()
-        conn.close()
         
         if row:
             return {
@@ -207,7 +479,7 @@ class Database:
     
     def create_customer(self, phone, name=None):
         """Create new customer"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         c = conn.cursor()
         
         # Generate system ID
@@ -215,23 +487,22 @@ class Database:
         
         try:
             c.execute(
-                "INSERT INTO customers (system_id, phone, name) VALUES (?, ?, ?)",
-                (system_id, phone, name)
+                "INSERT INTO customers (system_id, phone, name, phone_norm) VALUES (?, ?, ?, ?)",
+                (system_id, phone, name, normalize_phone(phone))
             )
             conn.commit()
             customer_id = c.lastrowid
         except sqlite3.IntegrityError:
             # Customer exists
-            c.execute("SELECT id, system_id FROM customers WHERE phone = ?", (phone,))
+            c.execute("SELECT id, system_id FROM customers WHERE phone_norm = ?", (normalize_phone(phone),))
             row = c.fetchone()
             customer_id, system_id = row[0], row[1]
         
-        conn.close()
         return system_id
     
     def update_customer(self, system_id, **kwargs):
         """Update customer info"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         c = conn.cursor()
         
         updates = ", ".join([f"{k} = ?" for k in kwargs.keys()])
@@ -239,11 +510,10 @@ class Database:
         
         c.execute(f"UPDATE customers SET {updates}, last_contact = CURRENT_TIMESTAMP WHERE system_id = ?", values)
         conn.commit()
-        conn.close()
     
     def create_ticket(self, customer_id, subject, description, priority="normal"):
         """Create support ticket"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         c = conn.cursor()
         
         ticket_id = "TKT" + datetime.now().strftime("%Y%m%d%H%M%S")
@@ -253,14 +523,12 @@ class Database:
             (ticket_id, customer_id, subject, description, priority)
         )
         conn.commit()
-        conn.close()
         
         return ticket_id
     
     def get_tickets(self, customer_id, status=None):
         """Get customer tickets"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        c = self.connection().cursor()
         
         if status:
             c.execute("SELECT * FROM tickets WHERE customer_id = ? AND status = ?", (customer_id, status))
@@ -268,13 +536,12 @@ class Database:
             c.execute("SELECT * FROM tickets WHERE customer_id = ?", (customer_id,))
         
         rows = c.fetchall()
-        conn.close()
         
         return [{"ticket_id": r[1], "subject": r[3], "status": r[5], "created_at": r[7]} for r in rows]
     
     def log_call(self, customer_id, call_type, duration, transcript, sentiment="neutral"):
         """Log call details"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         c = conn.cursor()
         
         c.execute(
@@ -282,26 +549,182 @@ class Database:
             (customer_id, call_type, duration, transcript, sentiment, datetime.now(), datetime.now())
         )
         conn.commit()
-        conn.close()
     
-    def search_faq(self, query):
-        """Search FAQ by keywords"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        words = query.lower().split()
-        results = []
-        
-        c.execute("SELECT question, answer, keywords FROM faq")
-        rows = c.fetchall()
-        
-        for row in rows:
-            score = sum(1 for word in words if word in row[2].lower())
-            if score > 0:
-                results.append({"question": row[0], "answer": row[1], "score": score})
-        
-        conn.close()
-        return sorted(results, key=lambda x: x["score"], reverse=True)
+    def search_faq(self, query, limit=5, min_score=None):
+        """Search FAQ (FTS5, BM25-ranked); best match first"""
+        terms = faq_terms(query)
+        if not terms:
+            return []
+        if min_score is None:
+            min_score = CONFIG["faq_min_score"]
+        if not self.has_fts:
+            # No FTS5 in this SQLite: score a one-off in-memory index instead
+            index = FAQIndex(self)
+            index.load(self.load_faqs())
+            return index.rank(query, limit, min_score)
+        
+        # Quote every term so user text can't inject FTS query syntax
+        match = " OR ".join('"%s"' % t for t in terms)
+        weights = ", ".join(str(w) for w in CONFIG["faq_weights"])
+        c = self.connection().cursor()
+        c.execute(f"""
+            SELECT faq.question, faq.answer, -bm25(faq_fts, {weights}) AS score
+            FROM faq_fts JOIN faq ON faq.id = faq_fts.rowid
+            WHERE faq_fts MATCH ?
+            ORDER BY score DESC
+            LIMIT ?
+        """, (match, limit))
+        
+        return [{"question": row[0], "answer": row[1], "score": row[2]}
+                for row in c.fetchall() if row[2] >= min_score]
+    
+    def faq_change_count(self):
+        """FAQ write counter (see _migrate_faq_change_counter)"""
+        return self.connection().execute("SELECT counter FROM faq_changes WHERE id = 1").fetchone()[0]
+    
+    def load_faqs(self):
+        """All FAQ rows as (question, answer, keywords)"""
+        return self.connection().execute("SELECT question, answer, keywords FROM faq ORDER BY id").fetchall()
+    
+    def load_intent_keywords(self):
+        """{intent: [keyword, ...]} from the intent_keywords table"""
+        intents = {}
+        for intent, keyword in self.connection().execute("SELECT intent, keyword FROM intent_keywords ORDER BY rowid"):
+            intents.setdefault(intent, []).append(keyword)
+        return intents
+    
+    def get_statistics(self):
+        """Customer / ticket / call counts"""
+        c = self.connection().cursor()
+        c.execute("""
+            SELECT (SELECT COUNT(*) FROM customers),
+                   (SELECT COUNT(*) FROM tickets),
+                   (SELECT COUNT(*) FROM tickets WHERE status = 'open'),
+                   (SELECT COUNT(*) FROM call_logs)
+        """)
+        row = c.fetchone()
+        return {
+            "total_customers": row[0],
+            "total_tickets": row[1],
+            "open_tickets": row[2],
+            "total_calls": row[3],
+        }
+
+
+def faq_stem(word):
+    """Light suffix stripping so 'hours'/'hour' and 'paying'/'pay' meet"""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+class FAQIndex:
+    """In-memory inverted index over the FAQ table, BM25-scored like search_faq.
+
+    search() answers from the index once it matches the DB's FAQ change
+    counter. Before the first build and while a rebuild runs in the
+    background after an FAQ write, it answers through Database.search_faq
+    (FTS5, or a scan), so results are never stale.
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self, db):
+        self.db = db
+        self.version = None  # change counter the loaded index reflects
+        self.wanted = None   # latest change counter seen in the DB
+        self.builder = None
+        self.checked_at = 0
+        self.refresh_lock = threading.Lock()  # guards checked_at/wanted/builder
+        self.lock = threading.Lock()
+        self.entries = []    # [(question, answer)]
+        self.postings = {}   # stem -> {entry: (question tf, answer tf, keyword tf)}
+        self.lengths = []    # tokens per entry, all columns
+        self.avg_length = 1
+    
+    def refresh(self, force=False):
+        """Rebuild when the FAQ change counter has moved (checked at most every
+        few seconds); in the background unless force is set"""
+        with self.refresh_lock:
+            now = time.monotonic()
+            if not force and now - self.checked_at < CONFIG["faq_index_check_interval"]:
+                return
+            self.checked_at = now
+            self.wanted = wanted = self.db.faq_change_count()
+            if not force:
+                if wanted != self.version and not (self.builder and self.builder.is_alive()):
+                    self.builder = threading.Thread(target=self._build, args=(wanted, True), daemon=True)
+                    self.builder.start()
+                return
+        self._build(wanted)
+    
+    def _build(self, version, background=False):
+        try:
+            self.load(self.db.load_faqs(), version)
+        except sqlite3.Error as e:
+            print(f"⚠️ FAQ index rebuild failed: {e}")
+        finally:
+            if background:
+                # Each rebuild gets a fresh thread; don't leave its connection behind
+                self.db.close_thread_connection()
+    
+    @property
+    def ready(self):
+        return self.version is not None and self.version == self.wanted
+    
+    def load(self, rows, version=None):
+        """Build the index from (question, answer, keywords) rows"""
+        entries, postings, lengths = [], {}, []
+        for question, answer, keywords in rows:
+            entry = len(entries)
+            entries.append((question, answer))
+            length = 0
+            for column, text in enumerate((question, answer, keywords)):
+                tokens = re.findall(r"\w+", (text or "").lower())
+                length += len(tokens)
+                for token in tokens:
+                    counts = postings.setdefault(faq_stem(token), {}).setdefault(entry, [0, 0, 0])
+                    counts[column] += 1
+            lengths.append(length)
+        
+        with self.lock:
+            self.entries = entries
+            self.postings = postings
+            self.lengths = lengths
+            self.avg_length = (sum(lengths) / len(lengths)) if lengths else 1
+            self.version = version
+    
+    def search(self, query, limit=5, min_score=None):
+        """Same contract as Database.search_faq: [{question, answer, score}], best first"""
+        self.refresh()
+        if not self.ready:
+            return self.db.search_faq(query, limit, min_score)
+        return self.rank(query, limit, min_score)
+    
+    def rank(self, query, limit=5, min_score=None):
+        """Score query against the loaded index"""
+        if min_score is None:
+            min_score = CONFIG["faq_min_score"]
+        weights = CONFIG["faq_weights"]
+        
+        with self.lock:
+            total = len(self.entries)
+            scores = {}
+            for stem in {faq_stem(t) for t in faq_terms(query)}:
+                hits = self.postings.get(stem)
+                if not hits:
+                    continue
+                idf = max(math.log((total - len(hits) + 0.5) / (len(hits) + 0.5)), 1e-6)
+                for entry, counts in hits.items():
+                    tf = sum(w * n for w, n in zip(weights, counts))
+                    norm = 1 - self.B + self.B * self.lengths[entry] / self.avg_length
+                    scores[entry] = scores.get(entry, 0) + idf * tf * (self.K1 + 1) / (tf + self.K1 * norm)
+            
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+            return [{"question": self.entries[e][0], "answer": self.entries[e][1], "score": score}
+                    for e, score in ranked if score >= min_score]
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -430,9 +853,246 @@ class VoiceEngine:
 # AI BRAIN
 # ═══════════════════════════════════════════════════════════════════
 
+# Checked in this order when two intents score the same
+DEFAULT_INTENTS = {
+    "greeting": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
+    "goodbye": ["bye", "goodbye", "see you", "thank you", "thanks", "that's all"],
+    "problem": ["problem", "issue", "help", "support", "broken", "not working", "error"],
+    "register": ["new", "register", "sign up", "first time", "create account"],
+    "billing": ["bill", "payment", "pay", "invoice", "charge", "mpesa"],
+    "order": ["order", "delivery", "track", "shipping", "package"],
+    "complaint": ["complaint", "unhappy", "dissatisfied", "angry", "frustrated"],
+    "human": ["human", "agent", "person", "operator", "real person", "speak to someone"],
+    "hours": ["hours", "open", "close", "time", "available"],
+    "contact": ["contact", "email", "phone", "reach", "address"],
+}
+
+
+def load_intents(db=None):
+    """Built-in intents, overridden by CONFIG['intents_file'], extended from the DB"""
+    intents = {name: list(keywords) for name, keywords in DEFAULT_INTENTS.items()}
+    
+    path = CONFIG.get("intents_file")
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                loaded = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring intents file {path}: {e}")
+            loaded = {}
+        if not isinstance(loaded, dict):
+            print(f"⚠️ Ignoring intents file {path}: expected an object of intent -> keyword list")
+            loaded = {}
+        for name, keywords in loaded.items():
+            if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+                print(f"⚠️ Ignoring intent '{name}' in {path}: keywords must be a list of strings")
+                continue
+            intents[name] = list(keywords)
+    
+    if db is not None:
+        for name, keywords in db.load_intent_keywords().items():
+            known = intents.setdefault(name, [])
+            known.extend(k for k in keywords if k not in known)
+    
+    return intents
+
+
+class IntentClassifier:
+    """All intent keywords compiled into one word-boundary regex"""
+    
+    def __init__(self, intents):
+        self.order = list(intents)
+        self.owners = {}  # keyword -> intents it signals
+        for name, keywords in intents.items():
+            for keyword in keywords:
+                keyword = " ".join(keyword.lower().split())
+                if keyword:
+                    self.owners.setdefault(keyword, []).append(name)
+        
+        # Longest first so "real person" wins over "person"
+        alternatives = sorted(self.owners, key=len, reverse=True)
+        body = "|".join(re.escape(k).replace(r"\ ", r"\s+") for k in alternatives)
+        self.pattern = re.compile(rf"(?<!\w)(?:{body})(?!\w)") if body else None
+    
+    def rank(self, text):
+        """[(intent, confidence)], best first; multi-word phrases count per word"""
+        if self.pattern is None:
+            return []
+        scores = {}
+        for match in self.pattern.finditer(text.lower()):
+            keyword = " ".join(match.group().split())
+            for name in self.owners[keyword]:
+                scores[name] = scores.get(name, 0) + len(keyword.split())
+        
+        total = sum(scores.values())
+        ranked = sorted(scores, key=lambda name: (-scores[name], self.order.index(name)))
+        return [(name, scores[name] / total) for name in ranked]
+
+
+class TurnDeadline(Exception):
+    """The turn's latency budget ended a request before the provider had a fair chance"""
+
+
+class ProviderSessions:
+    """Keep-alive requests.Session per provider host, shared by every conversation"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+    
+    def session(self, url):
+        """Pooled session for url's host (created on first use)"""
+        host = urlsplit(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Retries are done in get() so they can respect the turn's deadline
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=CONFIG["ai_pool_size"],
+                    max_retries=0,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.sessions[host] = session
+        return session
+    
+    def get(self, url, deadline):
+        """GET with (connect, read) timeouts, retrying connect failures with jittered backoff"""
+        session = self.session(url)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TurnDeadline("latency budget spent before the request")
+            connect = min(CONFIG["ai_connect_timeout"], remaining)
+            read = min(CONFIG["ai_request_timeout"], remaining)
+            sent = time.monotonic()
+            try:
+                return session.get(url, timeout=(connect, read))
+            except requests.exceptions.ReadTimeout as e:
+                # A provider that is just slow is left to the hedging, not retried
+                if read < CONFIG["ai_request_timeout"] and time.monotonic() - sent < CONFIG["ai_min_judged_wait"]:
+                    raise TurnDeadline("latency budget spent waiting for the answer") from e
+                raise
+            except requests.exceptions.ConnectionError as e:
+                # Includes connect timeouts
+                if (isinstance(e, requests.exceptions.ConnectTimeout) and connect < CONFIG["ai_connect_timeout"]
+                        and time.monotonic() - sent < CONFIG["ai_min_judged_wait"]):
+                    raise TurnDeadline("latency budget spent connecting") from e
+                if attempt >= CONFIG["ai_connect_retries"]:
+                    raise
+                backoff = random.uniform(0, CONFIG["ai_retry_backoff"] * 2 ** attempt)
+                if time.monotonic() + backoff >= deadline:
+                    raise
+                time.sleep(backoff)
+                attempt += 1
+    
+    def close(self):
+        """Drop every pooled connection"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+
+# One pool for the whole process; requests.Session and urllib3 pools are thread-safe for GETs
+AI_SESSIONS = ProviderSessions()
+
+
+class ProviderRouter:
+    """Per-provider health: success rate, EWMA latency and a circuit breaker"""
+    
+    def __init__(self, apis):
+        self.apis = list(apis)
+        self.lock = threading.Lock()
+        self.health = {
+            api["name"]: {
+                "successes": 0, "failures": 0, "streak": 0, "latency": None,
+                "state": "closed", "opened_at": 0, "probing": False, "last_error": None,
+            }
+            for api in self.apis
+        }
+    
+    def _expected_latency(self, h):
+        """EWMA latency inflated by failure odds; untried providers get the hedge delay"""
+        latency = h["latency"] if h["latency"] is not None else CONFIG["ai_hedge_delay"]
+        success_rate = (h["successes"] + 1) / (h["successes"] + h["failures"] + 1)
+        return latency / success_rate
+    
+    def order(self):
+        """Providers to try this turn: healthy by expected latency, then half-open probes"""
+        now = time.monotonic()
+        healthy, probes = [], []
+        with self.lock:
+            for api in self.apis:
+                h = self.health[api["name"]]
+                if h["state"] == "open" and now - h["opened_at"] >= CONFIG["ai_breaker_cooldown"]:
+                    h["state"] = "half_open"
+                if h["state"] == "closed":
+                    healthy.append(api)
+                elif h["state"] == "half_open" and not h["probing"]:
+                    h["probing"] = True  # one trial request at a time
+                    probes.append(api)
+            healthy.sort(key=lambda api: self._expected_latency(self.health[api["name"]]))
+        
+        # Everything tripped: still try them all rather than go silent
+        return healthy + probes or sorted(self.apis, key=lambda api: self._expected_latency(self.health[api["name"]]))
+    
+    def release(self, name):
+        """A provider picked by order() was never called (the turn ended first)"""
+        with self.lock:
+            self.health[name]["probing"] = False
+    
+    def record(self, name, ok, latency, error=None):
+        """Outcome of one call"""
+        with self.lock:
+            h = self.health[name]
+            h["probing"] = False
+            if ok:
+                h["successes"] += 1
+                h["streak"] = 0
+                h["state"] = "closed"
+                alpha = CONFIG["ai_latency_alpha"]
+                h["latency"] = latency if h["latency"] is None else alpha * latency + (1 - alpha) * h["latency"]
+                return
+            
+            h["failures"] += 1
+            h["streak"] += 1
+            h["last_error"] = error
+            if h["state"] == "half_open" or h["streak"] >= CONFIG["ai_breaker_failures"]:
+                if h["state"] != "open":
+                    print(f"⚠️ {name}: circuit opened after {h['streak']} failure(s) ({error})")
+                h["state"] = "open"
+                h["opened_at"] = time.monotonic()
+    
+    def stats(self):
+        """Snapshot per provider, in AI_APIS order"""
+        with self.lock:
+            rows = []
+            for api in self.apis:
+                h = self.health[api["name"]]
+                calls = h["successes"] + h["failures"]
+                rows.append({
+                    "name": api["name"],
+                    "state": h["state"],
+                    "calls": calls,
+                    "success_rate": h["successes"] / calls if calls else None,
+                    "latency": h["latency"],
+                    "last_error": h["last_error"],
+                })
+            return rows
+
+
 class AIBrain:
+    FALLBACK_RESPONSE = "I apologize, I'm having trouble processing that. Could you please repeat or rephrase?"
+    
     def __init__(self, db):
         self.db = db
+        self.faq_index = FAQIndex(db)
+        self.router = ProviderRouter(AI_APIS)
+        self.intents = IntentClassifier(load_intents(db))
         self.context = []
         self.max_context = 10
         
@@ -464,8 +1124,8 @@ TONE: Professional but warm, like a helpful friend who works at the company."""
             self.context = self.context[-self.max_context:]
         
         # Check FAQ first
-        faq_results = self.db.search_faq(user_input)
-        if faq_results and faq_results[0]["score"] >= 2:
+        faq_results = self.faq_index.search(user_input)
+        if faq_results:
             response = faq_results[0]["answer"]
             self.context.append({"role": "assistant", "content": response})
             return response
@@ -494,24 +1154,71 @@ Respond briefly to the customer's last message:"""
         return response
     
     def _call_ai_api(self, query):
-        """Call AI APIs with fallback"""
-        
-        for api in AI_APIS:
-            try:
-                url = api["url"].format(requests.utils.quote(query))
-                resp = requests.get(url, timeout=20)
-                data = resp.json()
-                
-                # Try different response keys
-                answer = data.get(api["response_key"]) or data.get("result") or data.get("message") or data.get("data") or data.get("answer")
-                
+        """Call AI APIs, hedged: first valid answer within the latency budget wins"""
+        deadline = time.monotonic() + CONFIG["ai_latency_budget"]
+        answers = queue.Queue()
+        done = threading.Event()
+        waiting = self.router.order()
+        in_flight = 0
+        
+        while waiting or in_flight:
+            if waiting:
+                api = waiting.pop(0)
+                threading.Thread(
+                    target=self._ask_provider, args=(api, query, deadline, done, answers), daemon=True
+                ).start()
+                in_flight += 1
+            
+            # Wait for an answer; if none comes within the hedge delay, start the next provider
+            while in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    done.set()
+                    for api in waiting:
+                        self.router.release(api["name"])
+                    return self.FALLBACK_RESPONSE
+                try:
+                    answer = answers.get(timeout=min(CONFIG["ai_hedge_delay"], remaining) if waiting else remaining)
+                except queue.Empty:
+                    break
+                in_flight -= 1
                 if answer:
-                    return self._clean_response(answer)
-                    
-            except Exception as e:
-                continue
-        
-        return "I apologize, I'm having trouble processing that. Could you please repeat or rephrase?"
+                    done.set()  # late providers' answers are dropped
+                    for api in waiting:
+                        self.router.release(api["name"])
+                    return answer
+                if waiting:
+                    break  # that provider failed; start the next one now
+        
+        return self.FALLBACK_RESPONSE
+    
+    def _ask_provider(self, api, query, deadline, done, answers):
+        """Query one provider and post its cleaned answer (or None) to answers"""
+        answer = None
+        if done.is_set() or deadline <= time.monotonic():
+            self.router.release(api["name"])
+            answers.put(None)
+            return
+        
+        started = time.monotonic()
+        try:
+            url = api["url"].format(requests.utils.quote(query))
+            resp = AI_SESSIONS.get(url, deadline)
+            data = resp.json()
+            
+            # Try different response keys
+            answer = data.get(api["response_key"]) or data.get("result") or data.get("message") or data.get("data") or data.get("answer")
+            answer = self._clean_response(answer) if answer else None
+            error = None if answer else "empty response"
+        except TurnDeadline:
+            # Cut off too soon to blame the provider: don't let it trip its breaker
+            self.router.release(api["name"])
+            answers.put(None)
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.router.record(api["name"], bool(answer), time.monotonic() - started, error)
+        answers.put(answer)
     
     def _clean_response(self, text):
         """Clean AI response for speech"""
@@ -529,27 +1236,17 @@ Respond briefly to the customer's last message:"""
         return text.strip()
     
     def analyze_intent(self, text):
-        """Analyze user intent"""
-        text_lower = text.lower()
-        
-        intents = {
-            "greeting": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
-            "goodbye": ["bye", "goodbye", "see you", "thank you", "thanks", "that's all"],
-            "problem": ["problem", "issue", "help", "support", "broken", "not working", "error"],
-            "register": ["new", "register", "sign up", "first time", "create account"],
-            "billing": ["bill", "payment", "pay", "invoice", "charge", "mpesa"],
-            "order": ["order", "delivery", "track", "shipping", "package"],
-            "complaint": ["complaint", "unhappy", "dissatisfied", "angry", "frustrated"],
-            "human": ["human", "agent", "person", "operator", "real person", "speak to someone"],
-            "hours": ["hours", "open", "close", "time", "available"],
-            "contact": ["contact", "email", "phone", "reach", "address"],
-        }
-        
-        for intent, keywords in intents.items():
-            if any(kw in text_lower for kw in keywords):
-                return intent
-        
-        return "general"
+        """Analyze user intent (top-ranked, or "general")"""
+        ranked = self.intents.rank(text)
+        return ranked[0][0] if ranked else "general"
+    
+    def rank_intents(self, text):
+        """All matching intents with confidences, best first"""
+        return self.intents.rank(text)
+    
+    def reload_intents(self):
+        """Rebuild the classifier after editing the intents file or table"""
+        self.intents = IntentClassifier(load_intents(self.db))
     
     def reset_context(self):
         """Reset conversation context"""
@@ -1076,32 +1773,20 @@ class RadiaxCustomerCare:
         print("📊 STATISTICS")
         print("─" * 60)
         
-        db = self.conversation.db
-        conn = sqlite3.connect(db.db_path)
-        c = conn.cursor()
-        
-        # Total customers
-        c.execute("SELECT COUNT(*) FROM customers")
-        total_customers = c.fetchone()[0]
+        stats = self.conversation.db.get_statistics()
         
-        # Total tickets
-        c.execute("SELECT COUNT(*) FROM tickets")
-        total_tickets = c.fetchone()[0]
-        
-        # Open tickets
-        c.execute("SELECT COUNT(*) FROM tickets WHERE status = 'open'")
-        open_tickets = c.fetchone()[0]
-        
-        # Total calls
-        c.execute("SELECT COUNT(*) FROM call_logs")
-        total_calls = c.fetchone()[0]
-        
-        conn.close()
+        print(f"  👥 Total Customers: {stats['total_customers']}")
+        print(f"  🎫 Total Tickets: {stats['total_tickets']}")
+        print(f"  📬 Open Tickets: {stats['open_tickets']}")
+        print(f"  📞 Total Calls: {stats['total_calls']}")
         
-        print(f"  👥 Total Customers: {total_customers}")
-        print(f"  🎫 Total Tickets: {total_tickets}")
-        print(f"  📬 Open Tickets: {open_tickets}")
-        print(f"  📞 Total Calls: {total_calls}")
+        print("\n  🤖 AI Providers (this session):")
+        for p in self.conversation.ai.router.stats():
+            rate = f"{p['success_rate']:.0%}" if p["success_rate"] is not None else "-"
+            latency = f"{p['latency']:.2f}s" if p["latency"] is not None else "-"
+            print(f"    {p['name']:<12} {p['state']:<10} calls {p['calls']:<5} ok {rate:<5} latency {latency}")
+            if p["state"] != "closed" and p["last_error"]:
+                print(f"      last error: {p['last_error'][:60]}")
         print("─" * 60)
         
         input("\nPress ENTER to continue...")
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════════╗
+║           CHAIRMAN OS - FLEET OPERATION BENCHMARK                ║
+╚══════════════════════════════════════════════════════════════════╝
+
+Times chairman's fleet operations against a synthetic fleet. Stand-in
+`pm2`, `git` and `npm` executables are put first on PATH, with
+configurable latency and output size, so no real bots or network are
+needed.
+
+    python3 bench_chairman.py --clients 10,100,1000
+    python3 bench_chairman.py --clients 100 --compare bench_results.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import builtins
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+OPERATIONS = ["view_clients", "start_all", "check_updates", "backup_sessions", "update_all_clients"]
+
+# ═══════════════════════════════════════════════════════════════
+# FAKE EXECUTABLES
+# ═══════════════════════════════════════════════════════════════
+
+FAKE_COMMON = r'''
+import os, sys, json, time, fcntl
+
+STATE = os.environ["BENCH_STATE"]
+
+def delay(tool):
+    time.sleep(float(os.environ.get(f"BENCH_{tool.upper()}_LATENCY", "0")))
+
+def chatter(tool):
+    for i in range(int(os.environ.get("BENCH_OUTPUT_LINES", "0"))):
+        print(f"{tool}: progress line {i} " + "." * 60)
+
+def with_state(fn):
+    with open(STATE, "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        state = json.load(f)
+        result = fn(state)
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+        return result
+
+def count(tool):
+    def bump(state):
+        state["calls"][tool] = state["calls"].get(tool, 0) + 1
+    with_state(bump)
+'''
+
+FAKE_PM2 = FAKE_COMMON + r'''
+args = sys.argv[1:]
+cmd = args[0] if args else "status"
+count("pm2")
+delay("pm2")
+
+def option(name):
+    return args[args.index(name) + 1] if name in args else None
+
+def act(state):
+    procs = state["processes"]
+    if cmd == "jlist":
+        return json.dumps([
+            {
+                "name": name,
+                "pid": p["pid"],
+                "pm2_env": {
+                    "status": p["status"],
+                    "restart_time": p["restarts"],
+                    "pm_uptime": p["started"],
+                    "pm_cwd": p["cwd"],
+                    "pm_out_log_path": p["out"],
+                    "pm_err_log_path": p["err"],
+                },
+                "monit": {"cpu": 0.5, "memory": 80 * 1024 * 1024},
+            }
+            for name, p in procs.items()
+        ])
+    if cmd == "start":
+        name = option("--name")
+        cwd = option("--cwd") or ""
+        logs = os.path.join(os.path.dirname(STATE), "pm2-logs")
+        procs[name] = {
+            "status": "online", "pid": 10000 + len(procs), "restarts": 0,
+            "started": int(time.time() * 1000), "cwd": cwd,
+            "out": os.path.join(logs, f"{name}-out.log"),
+            "err": os.path.join(logs, f"{name}-error.log"),
+        }
+    elif cmd in ("stop", "restart", "delete") and len(args) > 1:
+        name = args[1]
+        if name in procs:
+            if cmd == "delete":
+                del procs[name]
+            else:
+                procs[name]["status"] = "stopped" if cmd == "stop" else "online"
+                if cmd == "restart":
+                    procs[name]["restarts"] += 1
+    return None
+
+out = with_state(act)
+if out is not None:
+    print(out)
+else:
+    chatter("pm2")
+'''
+
+# The fake repository has two commits: what the synthetic clients run
+# and the release check_updates / update_all_clients move them to
+OLD_COMMIT = "1" * 40
+NEW_COMMIT = "2" * 40
+
+FAKE_GIT = FAKE_COMMON + f'''
+OLD, NEW = "{OLD_COMMIT}", "{NEW_COMMIT}"
+''' + r'''
+args = sys.argv[1:]
+count("git")
+delay("git")
+git_dir = None
+if args[:1] == ["--git-dir"]:
+    git_dir, args = args[1], args[2:]
+cmd = args[0] if args else ""
+revs = [a for a in args[1:] if not a.startswith("-")]
+
+def commit(rev):
+    """Resolve HEAD / main / a sha (optionally with ^{commit}) to OLD or NEW"""
+    rev = rev.split("^")[0].split(":")[0]
+    if rev in ("HEAD", "main", "origin/main") or NEW.startswith(rev or "-"):
+        return NEW
+    if OLD.startswith(rev or "-"):
+        return OLD
+    return None
+
+def write_head(dest):
+    os.makedirs(os.path.join(dest, ".git", "refs", "heads"), exist_ok=True)
+    with open(os.path.join(dest, ".git", "HEAD"), "w") as f:
+        f.write("ref: refs/heads/main\n")
+    with open(os.path.join(dest, ".git", "refs", "heads", "main"), "w") as f:
+        f.write(NEW + "\n")
+
+if cmd == "clone" and "--mirror" in args:
+    os.makedirs(revs[-1], exist_ok=True)
+    with open(os.path.join(revs[-1], "HEAD"), "w") as f:
+        f.write("ref: refs/heads/main\n")
+    sys.exit(0)
+if cmd == "fetch":
+    open(os.path.join(git_dir or ".git", "FETCH_HEAD"), "w").close()
+    sys.exit(0)
+if cmd in ("rev-parse", "cat-file"):
+    sha = commit(revs[-1]) if revs else None
+    if sha is None:
+        sys.exit(1)
+    if cmd == "rev-parse":
+        print(sha)
+    sys.exit(0)
+if cmd in ("rev-list", "log"):
+    base, _, target = revs[-1].partition("..")
+    newer = commit(base) == OLD and commit(target) == NEW
+    if cmd == "rev-list":
+        print(1 if newer else 0)
+    elif newer:
+        print(NEW[:7] + " Release " + os.environ.get("BENCH_RELEASE", "2.0.0"))
+    sys.exit(0)
+if cmd == "diff":
+    if commit(revs[0]) != commit(revs[1]):
+        print("M\tindex.js\nM\tpackage.json\nM\tpackage-lock.json")
+    sys.exit(0)
+if cmd == "show":
+    version = os.environ.get("BENCH_RELEASE", "2.0.0") if commit(revs[-1]) == NEW else "1.0.0"
+    print(json.dumps({"name": "bot", "version": version, "dependencies": {"baileys": version}}))
+    sys.exit(0)
+if cmd == "clone":
+    dest = args[-1]
+    write_head(dest)
+    os.makedirs(os.path.join(dest, "lib"), exist_ok=True)
+    with open(os.path.join(dest, "package.json"), "w") as f:
+        json.dump({"name": "bot", "version": os.environ.get("BENCH_RELEASE", "2.0.0")}, f)
+    with open(os.path.join(dest, "index.js"), "w") as f:
+        f.write("console.log('bot')\n")
+    for i in range(int(os.environ.get("BENCH_SOURCE_FILES", "20"))):
+        with open(os.path.join(dest, "lib", f"cmd{i}.js"), "w") as f:
+            f.write("// command\n" * 50)
+    print(f"Cloning into '{dest}'...")
+chatter("git")
+'''
+
+FAKE_NPM = FAKE_COMMON + r'''
+args = sys.argv[1:]
+count("npm")
+delay("npm")
+if args and args[0] in ("install", "i", "ci") and "-g" not in args:
+    files = int(os.environ.get("BENCH_NODE_MODULES_FILES", "200"))
+    size = int(os.environ.get("BENCH_NODE_MODULES_KB", "8")) * 1024
+    blob = b"x" * size
+    for i in range(files):
+        pkg = os.path.join("node_modules", f"pkg{i // 20}")
+        os.makedirs(pkg, exist_ok=True)
+        with open(os.path.join(pkg, f"file{i}.js"), "wb") as f:
+            f.write(blob)
+    print(f"added {files // 20} packages in 1s")
+chatter("npm")
+'''
+
+def install_fakes(bin_dir):
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name, source in (("pm2", FAKE_PM2), ("git", FAKE_GIT), ("npm", FAKE_NPM)):
+        path = bin_dir / name
+        path.write_text(f"#!{sys.executable}\n{source}")
+        path.chmod(0o755)
+
+# ═══════════════════════════════════════════════════════════════
+# SYNTHETIC FLEET
+# ═══════════════════════════════════════════════════════════════
+
+def write_blob(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(os.urandom(min(size, 4096)) * (size // 4096) + os.urandom(size % 4096))
+
+def make_client(client_dir, args):
+    """A cloned+installed bot with realistic session data"""
+    client_dir.mkdir(parents=True, exist_ok=True)
+    (client_dir / "package.json").write_text(json.dumps({"name": "bot", "version": "1.0.0"}))
+    (client_dir / "index.js").write_text("console.log('bot')\n")
+    (client_dir / ".git" / "refs" / "heads").mkdir(parents=True, exist_ok=True)
+    (client_dir / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (client_dir / ".git" / "refs" / "heads" / "main").write_text(OLD_COMMIT + "\n")
+
+    # Baileys-style session: creds + many small pre-key/sender-key files
+    session = client_dir / "session"
+    write_blob(session / "creds.json", 2048)
+    for i in range(args.session_files):
+        write_blob(session / f"pre-key-{i}.json", 600)
+    write_blob(client_dir / "database.json", args.database_kb * 1024)
+    write_blob(client_dir / "store" / "messages.json", args.store_kb * 1024)
+    (client_dir / ".env").write_text("PREFIX=.\nOWNER=254700000000\n")
+    (client_dir / "temp").mkdir(exist_ok=True)
+
+    blob = b"x" * (args.node_modules_kb * 1024)
+    for i in range(args.node_modules_files):
+        pkg = client_dir / "node_modules" / f"pkg{i // 20}"
+        pkg.mkdir(parents=True, exist_ok=True)
+        (pkg / f"file{i}.js").write_bytes(blob)
+
+def build_fleet(root, count, args):
+    clients = []
+    for i in range(count):
+        username = f"bot{i:04d}"
+        client_dir = root / "clients" / username
+        make_client(client_dir, args)
+        clients.append({
+            "username": username,
+            "directory": str(client_dir),
+            "created_at": datetime.now().isoformat(),
+        })
+    return clients
+
+# ═══════════════════════════════════════════════════════════════
+# HARNESS
+# ═══════════════════════════════════════════════════════════════
+
+def answer(prompt=""):
+    """Non-interactive answers for chairman's confirmation prompts"""
+    if "UPDATE ALL" in prompt:
+        return "UPDATE ALL"
+    if "yes/no" in prompt:
+        return "yes"
+    return ""
+
+def call_counts(state_file):
+    return json.loads(state_file.read_text())["calls"]
+
+def run_operation(chairman, name, state_file):
+    before = call_counts(state_file)
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        getattr(chairman, name)()
+    seconds = time.perf_counter() - started
+    after = call_counts(state_file)
+    return seconds, {tool: after.get(tool, 0) - before.get(tool, 0) for tool in after}
+
+def bench_fleet(count, args, env):
+    """Build a fleet of `count` clients and time each operation on it"""
+    root = Path(tempfile.mkdtemp(prefix=f"chairman-bench-{count}-"))
+    try:
+        state_file = root / "pm2-state.json"
+        state_file.write_text(json.dumps({"processes": {}, "calls": {}}))
+        os.environ.update(env, BENCH_STATE=str(state_file))
+
+        # get_remote_version() reads <repo>/main/package.json; serve it from disk
+        repo = root / "repo"
+        (repo / "main").mkdir(parents=True)
+        (repo / "main" / "package.json").write_text(json.dumps({"version": env["BENCH_RELEASE"]}))
+
+        import chairman
+        chairman.BASE_DIR = root / "clients"
+        chairman.CONFIG_FILE = root / "bot-manager" / "clients.json"
+        chairman.BACKUP_DIR = root / "backups"
+        chairman.LOG_DIR = root / "bot-manager" / "logs"
+        chairman.COMMAND_HISTORY = root / "bot-manager" / "commands.jsonl"
+        chairman.STAGE_LOG = root / "bot-manager" / "update_stages.jsonl"
+        chairman.DISK_INDEX = root / "bot-manager" / "disk_index.json"
+        chairman.SUPERVISOR_STATE = root / "bot-manager" / "supervisor.json"
+        chairman.JOBS_DB = root / "bot-manager" / "jobs.db"
+        chairman.LOG_ROTATE_CONFIG = root / "bot-manager" / "logrotate.json"
+        chairman.LOG_ROTATE_STATE = root / "bot-manager" / "logrotate_state.json"
+        chairman.REPO_CACHE = root / "bot-manager" / "repo.git"
+        chairman.BOT_REPO = repo.as_uri() + ".git"
+        chairman.pause = lambda: None
+        chairman.clear = lambda: None
+        builtins.input = answer
+
+        started = time.perf_counter()
+        clients = build_fleet(root, count, args)
+        chairman.save_clients({"clients": clients})
+        print(f"  fleet of {count} built in {time.perf_counter() - started:.1f}s")
+
+        # Keep the sync stats of each backup so the repeat run can show what it skipped
+        backup_stats = []
+        def recording_backup(*a, **kw):
+            result = backup_all_sessions(*a, **kw)
+            backup_stats.append(result[2])
+            return result
+        backup_all_sessions = chairman.backup_all_sessions
+        chairman.backup_all_sessions = recording_backup
+
+        results = []
+        for op in args.ops:
+            # A second backup shows what the change-aware copy saves
+            labels = [op, f"{op}_repeat"] if op == "backup_sessions" else [op]
+            for label in labels:
+                if op == "update_all_clients" and args.update_sample < count:
+                    chairman.save_clients({"clients": clients[:args.update_sample]})
+                backup_stats.clear()
+                seconds, calls = run_operation(chairman, op, state_file)
+                chairman.save_clients({"clients": clients})
+                targets = min(count, args.update_sample) if op == "update_all_clients" else count
+                result = {
+                    "operation": label,
+                    "clients": count,
+                    "targets": targets,
+                    "seconds": round(seconds, 4),
+                    "per_client_ms": round(seconds / max(targets, 1) * 1000, 3),
+                    "calls": calls,
+                }
+                line = f"  {label:<24} {seconds:>9.3f}s  {calls}"
+                if backup_stats:
+                    result["bytes_copied"] = sum(s["bytes"] for s in backup_stats)
+                    result["bytes_skipped"] = sum(s["bytes_skipped"] for s in backup_stats)
+                    line += f"  copied {result['bytes_copied']}B, skipped {result['bytes_skipped']}B"
+                results.append(result)
+                print(line)
+        chairman.backup_all_sessions = backup_all_sessions
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def compare(results, baseline_file, threshold):
+    """Print operations that got slower than the baseline by > threshold"""
+    baseline = json.loads(Path(baseline_file).read_text())
+    old = {(r["operation"], r["clients"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        prev = old.get((r["operation"], r["clients"]))
+        if not prev or prev["seconds"] <= 0:
+            continue
+        ratio = r["seconds"] / prev["seconds"]
+        marker = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"  {r['operation']:<24} {r['clients']:>5}  {prev['seconds']:>8.3f}s → {r['seconds']:>8.3f}s  x{ratio:.2f}  {marker}")
+        if marker != "ok":
+            regressions.append(r)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chairman fleet operations")
+    parser.add_argument("--clients", default="10,100", help="comma-separated fleet sizes")
+    parser.add_argument("--ops", default=",".join(OPERATIONS), help="comma-separated operations")
+    parser.add_argument("--pm2-latency", type=float, default=0.02, help="seconds per pm2 call")
+    parser.add_argument("--git-latency", type=float, default=0.2, help="seconds per git call")
+    parser.add_argument("--npm-latency", type=float, default=0.5, help="seconds per npm call")
+    parser.add_argument("--output-lines", type=int, default=20, help="lines printed per fake command")
+    parser.add_argument("--session-files", type=int, default=200)
+    parser.add_argument("--database-kb", type=int, default=256)
+    parser.add_argument("--store-kb", type=int, default=1024)
+    parser.add_argument("--node-modules-files", type=int, default=200)
+    parser.add_argument("--node-modules-kb", type=int, default=8)
+    parser.add_argument("--update-sample", type=int, default=10, help="clients updated by update_all_clients")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+    args.ops = [op for op in args.ops.split(",") if op]
+
+    unknown = set(args.ops) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(sorted(unknown))}")
+
+    bin_dir = Path(tempfile.mkdtemp(prefix="chairman-bench-bin-"))
+    install_fakes(bin_dir)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    env = {
+        "BENCH_PM2_LATENCY": str(args.pm2_latency),
+        "BENCH_GIT_LATENCY": str(args.git_latency),
+        "BENCH_NPM_LATENCY": str(args.npm_latency),
+        "BENCH_OUTPUT_LINES": str(args.output_lines),
+        "BENCH_NODE_MODULES_FILES": str(args.node_modules_files),
+        "BENCH_NODE_MODULES_KB": str(args.node_modules_kb),
+        "BENCH_RELEASE": "2.0.0",
+    }
+
+    results = []
+    try:
+        for count in [int(n) for n in args.clients.split(",") if n]:
+            print(f"\n▶ {count} clients")
+            results.extend(bench_fleet(count, args, env))
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout.strip()
+    except OSError:
+        commit = ""
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "host": socket.gethostname(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+
+    if args.compare:
+        print(f"\nCompared with {args.compare}:")
+        regressions = compare(results, args.compare, args.threshold)
+    else:
+        regressions = []
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {args.output}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
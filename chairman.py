@@ -8,9 +8,30 @@
 
 import os
 import sys
+import re
+import gzip
 import json
+import math
+import time
+import socket
+import platform
+import argparse
+import urllib.error
+import urllib.parse
+import urllib.request
 import shutil
+import ctypes
+import fcntl
+import resource
+import signal
+import hashlib
+import sqlite3
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing, contextmanager, suppress
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 # ═══════════════════════════════════════════════════════════════
@@ -18,9 +39,105 @@ from pathlib import Path
 # ═══════════════════════════════════════════════════════════════
 
 BASE_DIR = Path("/root/clients")
+# Extra volumes for client directories (BASE_DIR is always one of them),
+# e.g. [Path("/mnt/vol1/clients"), Path("/mnt/vol2/clients")]
+STORAGE_ROOTS = []
+PLACEMENT_POLICY = "least-used"  # least-used | least-loaded | pinned
 CONFIG_FILE = Path("/root/bot-manager/clients.json")
 BOT_REPO = "https://github.com/glen129/chairman.git"
 BACKUP_DIR = Path("/root/backups")
+LOG_DIR = Path("/root/bot-manager/logs")
+COMMAND_HISTORY = Path("/root/bot-manager/commands.jsonl")
+STAGE_LOG = Path("/root/bot-manager/update_stages.jsonl")
+HOSTS_FILE = Path("/root/bot-manager/hosts.json")
+BACKUP_TIMES = Path("/root/bot-manager/last_backup.json")
+DISK_INDEX = Path("/root/bot-manager/disk_index.json")
+SUPERVISOR_STATE = Path("/root/bot-manager/supervisor.json")
+JOBS_DB = Path("/root/bot-manager/jobs.db")
+LOG_ROTATE_CONFIG = Path("/root/bot-manager/logrotate.json")
+REPO_CACHE = Path("/root/bot-manager/repo-cache.git")
+LOG_ROTATE_STATE = Path("/root/bot-manager/logrotate_state.json")
+
+# Agent HTTP API (one per host) and controller timeouts in seconds
+AGENT_PORT = 8701
+AGENT_TIMEOUT = 30
+AGENT_UPDATE_TIMEOUT = 3600
+
+# API reads are served from a snapshot refreshed in the background
+CACHE_REFRESH = 5
+REMOTE_VERSION_REFRESH = 600
+DISK_USAGE_REFRESH = 600
+
+# Command runner limits (seconds per tool, max commands running at once)
+COMMAND_TIMEOUTS = {
+    "git": 300,
+    "npm": 900,
+    "pm2": 60,
+}
+MAX_PARALLEL = 4
+
+# Maintenance work (clones, npm install, backups, copies) runs at low CPU and
+# I/O priority so bots on the same host keep their latency. MAINTENANCE_IONICE
+# is "idle", "best-effort:<0-7>" or "off"; COPY_BANDWIDTH caps bulk file
+# copies in MB/s (0 = unlimited)
+MAINTENANCE_NICE = 10
+MAINTENANCE_IONICE = "idle"
+COPY_BANDWIDTH = 0
+COPY_CHUNK = 1024 * 1024
+
+# Preserve/restore: trees with at least this many files are copied on a pool
+SYNC_WORKERS = 8
+SYNC_PARALLEL_MIN_FILES = 200
+
+# Durable jobs: heartbeat/staleness in seconds; scheduled updates run inside
+# MAINTENANCE_WINDOW (local time, may wrap midnight)
+JOB_HEARTBEAT = 20
+JOB_STALE = 120
+JOB_POLL = 30
+MAINTENANCE_WINDOW = "02:00-05:00"
+
+# Client picker: rows per page, seconds a pm2 status snapshot is reused
+PICKER_PAGE_SIZE = 20
+PICKER_STATUS_TTL = 10
+
+# Crash-loop supervisor: CRASH_RESTARTS restarts within CRASH_WINDOW seconds
+# stop the bot for BACKOFF_BASE * 2^(strikes-1) seconds (capped); strikes
+# are forgiven after CRASH_FORGIVE seconds without a restart
+SUPERVISOR_INTERVAL = 15
+CRASH_WINDOW = 300
+CRASH_RESTARTS = 5
+BACKOFF_BASE = 60
+BACKOFF_MAX = 3600
+CRASH_FORGIVE = 3600
+
+# PM2 / command log rotation defaults; fleet-wide and per-client overrides
+# live in LOG_ROTATE_CONFIG (`chairman.py logs config ...`)
+LOG_MAX_MB = 50
+LOG_MAX_AGE_HOURS = 24
+LOG_RETAIN = 5
+LOG_ROTATE_INTERVAL = 60
+
+# Disk usage: directory sizes inside these items are reused while the
+# directory mtime is unchanged (files there are only added or replaced);
+# everything else is re-stat'd, and a full rescan happens every N hours
+DISK_STATIC_ITEMS = ["node_modules", ".git"]
+DISK_FULL_RESCAN_HOURS = 24
+
+# Safe-to-delete items: (path in client dir, files older than N days,
+# only once the item holds at least N MB)
+PRUNE_RULES = [
+    ("temp", 1, 0),
+    (".cache", 7, 0),
+    ("node_modules/.cache", 0, 50),
+    ("logs", 14, 50),
+]
+
+# Release planner: BOT_REPO mirror is fetched at most this often (seconds)
+REPO_CACHE_TTL = 60
+
+# Pre-cloned, pre-installed spare clients kept under BASE_DIR/.pool
+POOL_SIZE = 2
+POOL_MAX_AGE_DAYS = 7
 
 # Files and folders to preserve during updates (sessions, configs, data)
 PRESERVE_ITEMS = [
@@ -53,6 +170,524 @@ class C:
     BOLD = '\033[1m'
     END = '\033[0m'
 
+# ═══════════════════════════════════════════════════════════════
+# COMMAND RUNNER
+# ═══════════════════════════════════════════════════════════════
+
+_slots = threading.BoundedSemaphore(MAX_PARALLEL)
+_active = set()
+_active_lock = threading.Lock()
+_log_writers = {}  # command log path -> commands still appending to it
+_history_lock = threading.Lock()
+_cancelled = threading.Event()
+
+def _kill(proc):
+    """Kill a command and everything it spawned"""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _on_timeout(proc, record):
+    record["timed_out"] = True
+    _kill(proc)
+
+def _write_history(record):
+    entry = {k: v for k, v in record.items() if k != "output"}
+    try:
+        with _history_lock:
+            COMMAND_HISTORY.parent.mkdir(parents=True, exist_ok=True)
+            with open(COMMAND_HISTORY, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+def run_cmd(args, cwd=None, timeout=None, client=None, echo=False, log=True, interactive=False,
+            background=False):
+    """Run a command (no shell) and return its record.
+
+    Output is captured into record["output"] and appended to the client's
+    log, the process group is killed after `timeout` seconds (defaults to
+    COMMAND_TIMEOUTS for the tool) and at most MAX_PARALLEL commands run
+    at once. Interactive commands (node index.js, pm2 logs) keep the
+    terminal instead and are only recorded. background=True runs the
+    command under nice/ionice (MAINTENANCE_NICE / MAINTENANCE_IONICE).
+    """
+    args = [str(a) for a in args]
+    if timeout is None:
+        timeout = COMMAND_TIMEOUTS.get(Path(args[0]).name)
+    prefix = priority_prefix() if background else []
+    record = {
+        "cmd": args,
+        "client": client,
+        "cwd": str(cwd) if cwd else None,
+        "started_at": datetime.now().isoformat(),
+        "code": None,
+        "duration": 0.0,
+        "timed_out": False,
+        "cancelled": False,
+        "throttled": bool(prefix),
+    }
+    output = []
+    start = time.monotonic()
+    
+    if interactive:
+        try:
+            record["code"] = subprocess.call(args, cwd=cwd)
+        except KeyboardInterrupt:
+            record["code"] = 130
+        except OSError as e:
+            output.append(f"{e}\n")
+            record["code"] = 127
+    else:
+        with _slots:
+            if _cancelled.is_set():
+                record["cancelled"] = True
+                record["code"] = -1
+            else:
+                _run_captured(prefix + args, cwd, timeout, client, echo, log, record, output)
+    
+    record["duration"] = round(time.monotonic() - start, 3)
+    if log:
+        _write_history(record)
+    record["output"] = "".join(output)
+    return record
+
+def _close_command_log(logf):
+    logf.close()
+    with _active_lock:
+        _log_writers[logf.name] -= 1
+        if not _log_writers[logf.name]:
+            del _log_writers[logf.name]
+
+def _run_captured(args, cwd, timeout, client, echo, log, record, output):
+    logf = None
+    if log:
+        try:
+            LOG_DIR.mkdir(parents=True, exist_ok=True)
+            logf = open(LOG_DIR / f"{client or 'chairman'}.log", 'a')
+            logf.write(f"\n$ {' '.join(args)}  [{record['started_at']}]\n")
+            with _active_lock:
+                _log_writers[logf.name] = _log_writers.get(logf.name, 0) + 1
+        except OSError:
+            logf = None
+    
+    try:
+        proc = subprocess.Popen(
+            args, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, text=True, errors="replace",
+            start_new_session=True,
+        )
+    except OSError as e:
+        output.append(f"{e}\n")
+        record["code"] = 127
+        if logf:
+            logf.write(f"{e}\n")
+            _close_command_log(logf)
+        return
+    
+    begin = time.monotonic()
+    with _active_lock:
+        _active.add(proc)
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, _on_timeout, (proc, record))
+        timer.daemon = True
+        timer.start()
+    
+    try:
+        for line in proc.stdout:
+            output.append(line)
+            if echo:
+                print(line, end="", flush=True)
+            if logf:
+                logf.write(line)
+        proc.wait()
+    except KeyboardInterrupt:
+        record["cancelled"] = True
+        _kill(proc)
+        proc.wait()
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+        with _active_lock:
+            _active.discard(proc)
+        record["code"] = proc.returncode
+        if proc.returncode is not None and proc.returncode < 0 and _cancelled.is_set():
+            record["cancelled"] = True
+        if logf:
+            status = "timed out" if record["timed_out"] else f"exit {proc.returncode}"
+            logf.write(f"[{status}, {time.monotonic() - begin:.1f}s]\n")
+            _close_command_log(logf)
+
+def cancel_commands():
+    """Kill every running command and refuse new ones until reset"""
+    _cancelled.set()
+    with _active_lock:
+        procs = list(_active)
+    for proc in procs:
+        _kill(proc)
+
+def reset_cancel():
+    _cancelled.clear()
+
+def run_parallel(func, items, workers=MAX_PARALLEL):
+    """Run func over items on a thread pool, results in input order.
+
+    Exceptions are returned in place of results. Ctrl+C cancels every
+    running command before re-raising.
+    """
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(func, item): i for i, item in enumerate(items)}
+        try:
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+        except KeyboardInterrupt:
+            cancel_commands()
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
+def pm2(*args, client=None, **kwargs):
+    return run_cmd(["pm2", *args], client=client, **kwargs)
+
+def pm2_start(client, **kwargs):
+    """Start a client's index.js under PM2"""
+    clear_backoff(client['username'])
+    client_dir = client['directory']
+    return pm2("start", f"{client_dir}/index.js", "--name", client['username'],
+               "--cwd", client_dir, client=client['username'], **kwargs)
+
+def pm2_stop(username, **kwargs):
+    clear_backoff(username)
+    return pm2("stop", username, client=username, **kwargs)
+
+def pm2_save():
+    return pm2("save")
+
+def tail_lines(text, n=5):
+    return "\n".join(text.rstrip().splitlines()[-n:])
+
+# ═══════════════════════════════════════════════════════════════
+# MAINTENANCE PRIORITY
+# ═══════════════════════════════════════════════════════════════
+
+# ioprio_set / ioprio_get syscall numbers
+_CAP_SYS_NICE = 23
+_IOPRIO_SYSCALLS = {"x86_64": (251, 252), "aarch64": (30, 31)}
+_IOPRIO_WHO_PROCESS = 1
+_bandwidth_lock = threading.Lock()
+_bandwidth_next = [0.0]
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+except OSError:
+    _libc = None
+
+def _ionice_class():
+    """(class, level) for MAINTENANCE_IONICE, or None when off"""
+    name, _, level = (MAINTENANCE_IONICE or "off").partition(":")
+    if name == "idle":
+        return 3, 0
+    if name == "best-effort":
+        return 2, int(level or 7)
+    return None
+
+def priority_prefix():
+    """nice/ionice argv prefix for background commands (tools that exist only)"""
+    prefix = []
+    if MAINTENANCE_NICE and shutil.which("nice"):
+        prefix += ["nice", "-n", str(MAINTENANCE_NICE)]
+    io = _ionice_class()
+    if io and shutil.which("ionice"):
+        prefix += ["ionice", "-c", str(io[0])] + (["-n", str(io[1])] if io[0] == 2 else [])
+    return prefix
+
+def _can_renice_to(nice):
+    """Whether this process may set its nice value back down to `nice`"""
+    try:
+        with open("/proc/self/status") as f:
+            caps = next(line for line in f if line.startswith("CapEff:"))
+        if int(caps.split()[1], 16) & (1 << _CAP_SYS_NICE):
+            return True
+    except (OSError, StopIteration, ValueError):
+        pass
+    soft = resource.getrlimit(resource.RLIMIT_NICE)[0]
+    return soft == resource.RLIM_INFINITY or nice >= 20 - soft
+
+@contextmanager
+def maintenance_priority():
+    """Run in-process work (copies, hashing) at maintenance priority.
+
+    Applies to the calling thread only (threads and processes it starts
+    inherit it); the previous nice and I/O priority are restored
+    afterwards. Nice is left alone when it could not be restored (no
+    CAP_SYS_NICE / RLIMIT_NICE), so the menu never stays niced.
+    """
+    tid = threading.get_native_id()
+    saved_nice = saved_io = None
+    try:
+        saved_nice = os.getpriority(os.PRIO_PROCESS, tid)
+        if MAINTENANCE_NICE > saved_nice and _can_renice_to(saved_nice):
+            os.setpriority(os.PRIO_PROCESS, tid, MAINTENANCE_NICE)
+        else:
+            saved_nice = None
+    except OSError:
+        saved_nice = None
+    
+    calls = _IOPRIO_SYSCALLS.get(platform.machine())
+    io = _ionice_class()
+    if _libc and calls and io:
+        current = _libc.syscall(calls[1], _IOPRIO_WHO_PROCESS, tid)
+        if current >= 0 and _libc.syscall(calls[0], _IOPRIO_WHO_PROCESS, tid, (io[0] << 13) | io[1]) == 0:
+            saved_io = current
+    try:
+        yield
+    finally:
+        if saved_io is not None and _libc.syscall(calls[0], _IOPRIO_WHO_PROCESS, tid, saved_io) != 0:
+            sys.stderr.write(f"[priority] could not restore I/O priority: {os.strerror(ctypes.get_errno())}\n")
+        if saved_nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, saved_nice)
+            except OSError as e:
+                sys.stderr.write(f"[priority] could not restore nice {saved_nice}: {e}\n")
+
+def _pace(nbytes):
+    """Block so bulk copies average at most COPY_BANDWIDTH MB/s; returns seconds waited"""
+    with _bandwidth_lock:
+        now = time.monotonic()
+        start = max(_bandwidth_next[0], now)
+        _bandwidth_next[0] = start + nbytes / (COPY_BANDWIDTH * 1024 * 1024)
+    wait = start - now
+    if wait > 0:
+        time.sleep(wait)
+    return wait
+
+def paced_copy(src, dst, stats=None, lock=None, **kwargs):
+    """shutil.copy2, chunked and paced when COPY_BANDWIDTH is set.
+
+    Time spent waiting on the limit is added to stats["throttle_wait"].
+    """
+    if not COPY_BANDWIDTH or os.path.islink(src):
+        return shutil.copy2(src, dst, **kwargs)
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    waited = 0.0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        for chunk in iter(lambda: fin.read(COPY_CHUNK), b''):
+            waited += _pace(len(chunk))
+            fout.write(chunk)
+    shutil.copystat(src, dst)
+    if stats is not None:
+        if lock:
+            with lock:
+                stats["throttle_wait"] = stats.get("throttle_wait", 0.0) + waited
+        else:
+            stats["throttle_wait"] = stats.get("throttle_wait", 0.0) + waited
+    return dst
+
+def print_throttle_report(days=30, client=None):
+    """How long throttled commands and copy stages took"""
+    cutoff = datetime.now().timestamp() - days * 86400
+    by_tool = {}
+    if COMMAND_HISTORY.exists():
+        with open(COMMAND_HISTORY) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    started = datetime.fromisoformat(rec["started_at"]).timestamp()
+                except (ValueError, KeyError):
+                    continue
+                if not rec.get("throttled") or started < cutoff or (client and rec.get("client") != client):
+                    continue
+                tool = Path(rec["cmd"][0]).name
+                step = rec["cmd"][1] if len(rec["cmd"]) > 1 else ""
+                by_tool.setdefault(f"{tool} {step}".strip(), []).append(rec["duration"])
+    
+    print(f"{C.CYAN}Throttled work in the last {days} days "
+          f"(nice {MAINTENANCE_NICE}, ionice {MAINTENANCE_IONICE}, "
+          f"copy limit {f'{COPY_BANDWIDTH} MB/s' if COPY_BANDWIDTH else 'off'}){C.END}\n")
+    print(f"{'Command':<17} {'Runs':>5} {'p50':>9} {'p95':>9} {'Total':>10}")
+    print("─" * 75)
+    for name in sorted(by_tool):
+        secs = by_tool[name]
+        print(f"{name:<17} {len(secs):>5} {percentile(secs, 50):>8.1f}s {percentile(secs, 95):>8.1f}s {sum(secs):>9.1f}s")
+    if not by_tool:
+        print(f"{C.YELLOW}No throttled commands recorded yet.{C.END}")
+    
+    runs = load_update_runs(days, client)
+    print(f"\n{'Copy stage':<17} {'Runs':>5} {'p50':>9} {'p95':>9} {'Total':>10} {'Limit wait':>11}")
+    print("─" * 75)
+    for stage in ("preserve_backup", "safety_backup", "restore"):
+        samples = [r["stages"][stage] for r in runs if stage in r.get("stages", {})]
+        if not samples:
+            continue
+        secs = [s["seconds"] for s in samples]
+        wait = sum(s.get("throttle_wait", 0) for s in samples)
+        print(f"{stage:<17} {len(samples):>5} {percentile(secs, 50):>8.1f}s {percentile(secs, 95):>8.1f}s "
+              f"{sum(secs):>9.1f}s {wait:>10.1f}s")
+
+# ═══════════════════════════════════════════════════════════════
+# UPDATE TIMING
+# ═══════════════════════════════════════════════════════════════
+
+UPDATE_STAGES = ["stop", "preserve_backup", "safety_backup", "clone", "restore", "npm_install"]
+_stage_log_lock = threading.Lock()
+
+def tree_size(path):
+    """Total bytes and file count under path (symlinks not followed)"""
+    total, files = 0, 0
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size, 1
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+            except OSError:
+                pass
+    return total, files
+
+def counting_copy(stats):
+    """copy2 that tallies bytes/files into stats (usable as copytree copy_function)"""
+    def copy(src, dst, **kwargs):
+        result = paced_copy(src, dst, stats, **kwargs)
+        stats["bytes"] += os.path.getsize(result)
+        stats["files"] += 1
+        return result
+    return copy
+
+def new_update_run(username):
+    return {
+        "run_id": datetime.now().strftime('%Y%m%d_%H%M%S'),
+        "client": username,
+        "host": socket.gethostname(),
+        "started_at": datetime.now().isoformat(),
+        "stages": {},
+        "ok": False,
+    }
+
+def record_stage(run, stage, seconds, size=None):
+    """Store how long a stage took and how much it moved"""
+    size = size or {}
+    run["stages"][stage] = {
+        "seconds": round(seconds, 3),
+        "bytes": size.get("bytes", 0),
+        "files": size.get("files", 0),
+        "bytes_skipped": size.get("bytes_skipped", 0),
+        "throttle_wait": round(size.get("throttle_wait", 0.0), 3),
+    }
+
+def finish_update_run(run, ok):
+    """Append the run as one JSON line to STAGE_LOG"""
+    run["ok"] = ok
+    run["seconds"] = round(sum(s["seconds"] for s in run["stages"].values()), 3)
+    try:
+        with _stage_log_lock:
+            STAGE_LOG.parent.mkdir(parents=True, exist_ok=True)
+            with open(STAGE_LOG, 'a') as f:
+                f.write(json.dumps(run) + "\n")
+    except OSError:
+        pass
+    return ok
+
+def load_update_runs(days=None, client=None):
+    runs = []
+    if not STAGE_LOG.exists():
+        return runs
+    cutoff = datetime.now().timestamp() - days * 86400 if days else None
+    with open(STAGE_LOG) as f:
+        for line in f:
+            try:
+                run = json.loads(line)
+                started = datetime.fromisoformat(run["started_at"]).timestamp()
+            except (ValueError, KeyError):
+                continue
+            if cutoff and started < cutoff:
+                continue
+            if client and run.get("client") != client:
+                continue
+            runs.append(run)
+    return runs
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+def fmt_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+def print_stage_report(days=30, client=None):
+    """p50/p95 per update stage across the fleet, then per day"""
+    runs = load_update_runs(days, client)
+    scope = f"client {client}" if client else "all clients"
+    print(f"{C.CYAN}Update runs in the last {days} days ({scope}): {len(runs)}{C.END}\n")
+    if not runs:
+        print(f"{C.YELLOW}No update timings recorded yet.{C.END}")
+        return
+    
+    print(f"{'Stage':<17} {'Runs':>5} {'p50':>9} {'p95':>9} {'Max':>9} {'p50 size':>10} {'p50 files':>10}")
+    print("─" * 75)
+    for stage in UPDATE_STAGES + ["total"]:
+        if stage == "total":
+            samples = [
+                {
+                    "seconds": r.get("seconds", 0),
+                    "bytes": sum(s["bytes"] for s in r["stages"].values()),
+                    "files": sum(s["files"] for s in r["stages"].values()),
+                }
+                for r in runs if r.get("ok")
+            ]
+            print("─" * 75)
+        else:
+            samples = [r["stages"][stage] for r in runs if stage in r.get("stages", {})]
+        if not samples:
+            continue
+        secs = [s["seconds"] for s in samples]
+        print(f"{stage:<17} {len(samples):>5} {percentile(secs, 50):>8.1f}s {percentile(secs, 95):>8.1f}s "
+              f"{max(secs):>8.1f}s {fmt_bytes(percentile([s['bytes'] for s in samples], 50)):>10} "
+              f"{percentile([s['files'] for s in samples], 50):>10}")
+    
+    by_day = {}
+    for run in runs:
+        by_day.setdefault(run["started_at"][:10], []).append(run)
+    
+    print(f"\n{'Day':<12} {'Runs':>5} {'Failed':>7} {'p50 total':>10} {'p95 total':>10}  Slowest stage (p50)")
+    print("─" * 75)
+    for day in sorted(by_day):
+        day_runs = by_day[day]
+        totals = [r.get("seconds", 0) for r in day_runs if r.get("ok")]
+        failed = sum(1 for r in day_runs if not r.get("ok"))
+        stage_p50 = {
+            stage: percentile([r["stages"][stage]["seconds"] for r in day_runs if stage in r["stages"]], 50)
+            for stage in UPDATE_STAGES
+        }
+        slowest = max(stage_p50, key=stage_p50.get)
+        print(f"{day:<12} {len(day_runs):>5} {failed:>7} {percentile(totals, 50):>9.1f}s "
+              f"{percentile(totals, 95):>9.1f}s  {slowest} ({stage_p50[slowest]:.1f}s)")
+
 # ═══════════════════════════════════════════════════════════════
 # UTILITY FUNCTIONS
 # ═══════════════════════════════════════════════════════════════
@@ -96,6 +731,13 @@ def menu():
 │  {C.CYAN}[13]{C.END} 🔄 Update Single Client (Keep Session)                   │
 │  {C.CYAN}[14]{C.END} 🔄 Update ALL Clients (Keep Sessions)                    │
 │  {C.CYAN}[15]{C.END} 📥 Check for Updates                                     │
+│  {C.CYAN}[16]{C.END} ⏱️  Update Timing Report                                 │
+{C.GREEN}├────────────────────────────────────────────────────────────────┤{C.END}
+│  {C.BLUE}[17]{C.END} ⚡ Spare Pool (Pre-installed Clients)                    │
+│  {C.BLUE}[18]{C.END} 🌐 Fleet View (All Hosts)                                │
+│  {C.BLUE}[19]{C.END} 💽 Storage Volumes & Migration                           │
+│  {C.BLUE}[20]{C.END} 🧹 Disk Usage & Cleanup                                  │
+│  {C.BLUE}[21]{C.END} 📅 Jobs & Scheduled Updates                              │
 {C.GREEN}├────────────────────────────────────────────────────────────────┤{C.END}
 │  {C.YELLOW}[0]{C.END}  🚪 Exit                                                 │
 {C.GREEN}└────────────────────────────────────────────────────────────────┘{C.END}
@@ -112,41 +754,148 @@ def save_clients(data):
     with open(CONFIG_FILE, 'w') as f:
         json.dump(data, f, indent=2)
 
-def get_status(name):
-    result = os.popen(f"pm2 jlist 2>/dev/null").read()
+def pm2_processes():
+    """All PM2 processes from a single `pm2 jlist`: {name: process}"""
+    output = pm2("jlist", log=False)["output"]
     try:
-        processes = json.loads(result)
-        for p in processes:
-            if p.get('name') == name:
-                return p.get('pm2_env', {}).get('status', 'unknown')
-    except:
-        pass
+        processes = json.loads(output[output.find('['):])
+        return {p.get('name'): p for p in processes}
+    except ValueError:
+        return {}
+
+def get_status(name, processes=None):
+    if processes is None:
+        processes = pm2_processes()
+    p = processes.get(name)
+    if p:
+        return p.get('pm2_env', {}).get('status', 'unknown')
     return 'stopped'
 
 def pause():
     input(f"\n{C.YELLOW}Press Enter to continue...{C.END}")
 
+_client_index = {"key": None, "clients": [], "names": [], "tags": []}
+_status_cache = {"at": 0.0, "statuses": {}}
+
+def client_index():
+    """Registry entries with lower-cased names/tags, rebuilt when clients.json changes"""
+    try:
+        st = os.stat(CONFIG_FILE)
+        key = (str(CONFIG_FILE), st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+    if key is None or key != _client_index["key"]:
+        clients = load_clients()['clients']
+        _client_index.update({
+            "key": key,
+            "clients": clients,
+            "names": [c['username'].lower() for c in clients],
+            "tags": [{t.lower() for t in c.get('tags', [])} for c in clients],
+        })
+    return _client_index
+
+def cached_statuses():
+    """{username: status} from the fleet cache, or one pm2 jlist per PICKER_STATUS_TTL"""
+    with _cache_lock:
+        if _fleet_cache["refreshed_at"] and time.monotonic() - _fleet_cache["refreshed_mono"] < PICKER_STATUS_TTL:
+            return {c["username"]: c["status"] for c in _fleet_cache["clients"]}
+    if time.monotonic() - _status_cache["at"] > PICKER_STATUS_TTL:
+        processes = pm2_processes()
+        _status_cache["statuses"] = {name: p.get('pm2_env', {}).get('status', 'unknown')
+                                     for name, p in processes.items()}
+        _status_cache["at"] = time.monotonic()
+    return _status_cache["statuses"]
+
+def _match_score(name, term):
+    """Lower is better: exact, prefix, substring, then in-order fuzzy; None = no match"""
+    if name == term:
+        return 0
+    if name.startswith(term):
+        return 1
+    if term in name:
+        return 2
+    pos, gaps = -1, 0
+    for ch in term:
+        found = name.find(ch, pos + 1)
+        if found < 0:
+            return None
+        gaps += found - pos - 1
+        pos = found
+    return 3 + gaps
+
+def search_clients(query="", statuses=None):
+    """Clients matching a query like "ali status:online version:2. tag:vip", best first"""
+    index = client_index()
+    statuses = cached_statuses() if statuses is None else statuses
+    terms, filters = [], {}
+    for word in query.lower().split():
+        field, sep, value = word.partition(':')
+        if sep and field in ("status", "version", "tag"):
+            filters[field] = value
+        else:
+            terms.append(word)
+    
+    results = []
+    for i, client in enumerate(index["clients"]):
+        name = index["names"][i]
+        if "status" in filters and statuses.get(client['username'], 'stopped') != filters["status"]:
+            continue
+        if "tag" in filters and filters["tag"] not in index["tags"][i]:
+            continue
+        if "version" in filters and not cached_local_version(client['directory']).startswith(filters["version"]):
+            continue
+        score = 0
+        for term in terms:
+            s = _match_score(name, term)
+            if s is None:
+                break
+            score += s
+        else:
+            results.append((score, name, client))
+    results.sort(key=lambda r: (r[0], r[1]))
+    return [client for _, _, client in results]
+
 def select_client():
-    data = load_clients()
-    if not data['clients']:
+    index = client_index()
+    if not index['clients']:
         print(f"{C.YELLOW}No clients found. Add one first!{C.END}")
         return None
     
-    print(f"\n{C.CYAN}Select a client:{C.END}\n")
-    for i, client in enumerate(data['clients'], 1):
-        status = get_status(client['username'])
-        icon = "🟢" if status == "online" else "🔴"
-        print(f"  [{i}] {icon} {client['username']}")
-    print(f"  [0] Cancel")
-    
-    try:
-        choice = int(input(f"\n{C.YELLOW}Enter number: {C.END}"))
-        if choice == 0:
+    query, page = "", 0
+    while True:
+        statuses = cached_statuses()
+        matches = search_clients(query, statuses)
+        pages = max(1, math.ceil(len(matches) / PICKER_PAGE_SIZE))
+        page = min(page, pages - 1)
+        first = page * PICKER_PAGE_SIZE
+        
+        shown = f"{len(matches)} of {len(index['clients'])}"
+        print(f"\n{C.CYAN}Select a client:{C.END} ({shown}{f', search: {query}' if query else ''})\n")
+        for i, client in enumerate(matches[first:first + PICKER_PAGE_SIZE], first + 1):
+            icon = "🟢" if statuses.get(client['username']) == "online" else "🔴"
+            tags = f" {C.BLUE}#{' #'.join(client['tags'])}{C.END}" if client.get('tags') else ""
+            print(f"  [{i}] {icon} {client['username']:<20} {cached_local_version(client['directory']):<10}{tags}")
+        print(f"  [0] Cancel")
+        if len(index['clients']) > PICKER_PAGE_SIZE or query:
+            print(f"\n  Page {page + 1}/{pages} · n/p = next/prev page · "
+                  f"type to search (status:online version:2. tag:vip)")
+        
+        choice = input(f"\n{C.YELLOW}Enter number or search: {C.END}").strip()
+        if choice == '0':
             return None
-        if 1 <= choice <= len(data['clients']):
-            return data['clients'][choice - 1]
-    except:
-        pass
+        if choice.isdigit():
+            number = int(choice)
+            if 1 <= number <= len(matches):
+                return matches[number - 1]
+            break
+        if choice in ('n', 'p'):
+            page = max(0, page + (1 if choice == 'n' else -1))
+        elif choice:
+            query, page = choice, 0
+        elif len(matches) == 1:
+            return matches[0]
+        else:
+            break
     print(f"{C.RED}Invalid choice!{C.END}")
     return None
 
@@ -201,53 +950,217 @@ def get_remote_version():
 # UPDATE FUNCTIONS
 # ═══════════════════════════════════════════════════════════════
 
-def backup_preserved_items(client_dir, backup_path):
-    """Backup session files and important data before update"""
+def new_sync_stats():
+    return {"bytes": 0, "files": 0, "bytes_skipped": 0, "files_skipped": 0, "renamed": 0}
+
+def sync_summary(stats):
+    summary = f"{fmt_bytes(stats['bytes'])} copied, {fmt_bytes(stats['bytes_skipped'])} unchanged"
+    if stats["renamed"]:
+        summary += f", {stats['renamed']} moved in place"
+    return summary
+
+def file_digest(path):
+    h = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+def _sync_file(src, dst, stats, lock):
+    """Copy src over dst unless dst already has the same size/mtime or content"""
+    st = os.stat(src)
+    try:
+        dst_st = os.stat(dst)
+        same = dst_st.st_size == st.st_size and (
+            dst_st.st_mtime_ns == st.st_mtime_ns or file_digest(src) == file_digest(dst)
+        )
+    except FileNotFoundError:
+        dst_st = None
+        same = False
+    
+    if same:
+        if dst_st.st_mtime_ns != st.st_mtime_ns:
+            shutil.copystat(src, dst)
+        with lock:
+            stats["bytes_skipped"] += st.st_size
+            stats["files_skipped"] += 1
+    else:
+        if dst_st is not None and dst_st.st_nlink > 1:
+            # dst is shared with a backup snapshot; writing in place would change it too
+            os.unlink(dst)
+        paced_copy(src, dst, stats, lock)
+        with lock:
+            stats["bytes"] += st.st_size
+            stats["files"] += 1
+
+def _remove(path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+def _sync_link(src, dst):
+    """Recreate a symlink as-is (node_modules/.bin relies on them)"""
+    link = os.readlink(src)
+    if os.path.islink(dst) and os.readlink(dst) == link:
+        return
+    if os.path.lexists(dst):
+        _remove(Path(dst))
+    os.symlink(link, dst)
+
+def _shares_inodes(path):
+    """True if any file under path is hard-linked from somewhere else"""
+    path = Path(path)
+    if path.is_symlink() or not path.is_dir():
+        return not path.is_symlink() and os.stat(path).st_nlink > 1
+    for root, _, files in os.walk(path):
+        for name in files:
+            if os.lstat(os.path.join(root, name)).st_nlink > 1:
+                return True
+    return False
+
+def sync_item(source, dest, stats, move=False):
+    """Make dest an exact copy of source, touching only what differs.
+
+    With move=True and both paths on the same filesystem the item is
+    renamed into place instead of copied, unless it holds files that are
+    hard-linked into a backup snapshot.
+    """
+    source, dest = Path(source), Path(dest)
+    lock = threading.Lock()
+    
+    if (move and os.stat(source).st_dev == os.stat(dest.parent).st_dev
+            and not _shares_inodes(source)):
+        if dest.exists() or dest.is_symlink():
+            _remove(dest)
+        os.rename(source, dest)
+        stats["renamed"] += 1
+        return
+    
+    if source.is_symlink():
+        _sync_link(source, dest)
+        return
+    
+    if not source.is_dir():
+        if dest.is_dir() and not dest.is_symlink():
+            shutil.rmtree(dest)
+        _sync_file(source, dest, stats, lock)
+        return
+    
+    if dest.is_symlink() or (dest.exists() and not dest.is_dir()):
+        dest.unlink()
+    
+    pairs = []
+    for root, dirs, files in os.walk(source):
+        rel = Path(root).relative_to(source)
+        target = dest / rel
+        if target.is_symlink():
+            target.unlink()
+        target.mkdir(parents=True, exist_ok=True)
+        
+        # Drop anything the source no longer has
+        wanted = set(dirs) | set(files)
+        for existing in os.listdir(target):
+            if existing not in wanted:
+                _remove(target / existing)
+        
+        for name in dirs + files:
+            src = Path(root) / name
+            if src.is_symlink():
+                _sync_link(src, target / name)
+            elif name in files:
+                pairs.append((src, target / name))
+    
+    if len(pairs) >= SYNC_PARALLEL_MIN_FILES:
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+            list(pool.map(lambda pair: _sync_file(*pair, stats, lock), pairs))
+    else:
+        for src, dst in pairs:
+            _sync_file(src, dst, stats, lock)
+
+def preserve_mirror(client_dir):
+    """Stable per-client copy of the preserved items that backups sync into"""
+    return BACKUP_DIR / "preserve" / Path(client_dir).name
+
+def _link_file(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different filesystem or link limit reached
+        shutil.copy2(src, dst)
+
+def link_snapshot(source, dest):
+    """Recreate source at dest with hard links instead of copying data"""
+    source, dest = Path(source), Path(dest)
+    if dest.exists() or dest.is_symlink():
+        _remove(dest)
+    if source.is_symlink():
+        os.symlink(os.readlink(source), dest)
+        return
+    if not source.is_dir():
+        _link_file(source, dest)
+        return
+    for root, dirs, files in os.walk(source):
+        target = dest / Path(root).relative_to(source)
+        target.mkdir(parents=True, exist_ok=True)
+        for name in dirs + files:
+            src = os.path.join(root, name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), target / name)
+            elif name in files:
+                _link_file(src, target / name)
+
+def backup_preserved_items(client_dir, backup_path, stats=None):
+    """Backup session files and important data before update.
+
+    Items are synced into the client's preserve_mirror() first, so only
+    what changed since the last backup is copied, and backup_path is then
+    filled with hard links to the mirror.
+    """
     client_dir = Path(client_dir)
     backup_path = Path(backup_path)
     backup_path.mkdir(parents=True, exist_ok=True)
+    mirror = preserve_mirror(client_dir)
+    mirror.mkdir(parents=True, exist_ok=True)
     
     backed_up = []
-    
-    for item in PRESERVE_ITEMS:
-        source = client_dir / item
-        if source.exists():
-            dest = backup_path / item
+    stats = stats if stats is not None else new_sync_stats()
+    
+    # An update and a fleet backup of the same client may run at once
+    with open(mirror.parent / f"{mirror.name}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        for item in PRESERVE_ITEMS:
+            source = client_dir / item
+            if not source.exists():
+                if (mirror / item).exists() or (mirror / item).is_symlink():
+                    _remove(mirror / item)
+                continue
             try:
-                if source.is_dir():
-                    shutil.copytree(source, dest)
-                else:
-                    shutil.copy2(source, dest)
+                sync_item(source, mirror / item, stats)
+                link_snapshot(mirror / item, backup_path / item)
                 backed_up.append(item)
             except Exception as e:
                 print(f"  {C.YELLOW}⚠️ Could not backup {item}: {e}{C.END}")
     
     return backed_up
 
-def restore_preserved_items(backup_path, client_dir):
-    """Restore session files and important data after update"""
+def restore_preserved_items(backup_path, client_dir, stats=None, move=False):
+    """Restore session files and important data after update.
+
+    move=True renames items out of backup_path when it is on the same
+    filesystem, leaving the backup emptied.
+    """
     backup_path = Path(backup_path)
     client_dir = Path(client_dir)
     
     restored = []
+    stats = stats if stats is not None else new_sync_stats()
     
     for item in PRESERVE_ITEMS:
         source = backup_path / item
         if source.exists():
-            dest = client_dir / item
             try:
-                # Remove new version's file/folder if exists
-                if dest.exists():
-                    if dest.is_dir():
-                        shutil.rmtree(dest)
-                    else:
-                        dest.unlink()
-                
-                # Restore from backup
-                if source.is_dir():
-                    shutil.copytree(source, dest)
-                else:
-                    shutil.copy2(source, dest)
+                sync_item(source, client_dir / item, stats, move=move)
                 restored.append(item)
             except Exception as e:
                 print(f"  {C.YELLOW}⚠️ Could not restore {item}: {e}{C.END}")
@@ -255,106 +1168,144 @@ def restore_preserved_items(backup_path, client_dir):
     return restored
 
 def update_single_client(client, auto_restart=True):
-    """Update a single client while preserving session"""
-    username = client['username']
-    client_dir = Path(client['directory'])
-    
+    """Update a single client while preserving session.
+
+    Runs as a durable job: every step is checkpointed in JOBS_DB so an
+    interrupted update can be resumed or rolled back (`jobs resume`).
+    """
+    job_id = enqueue_job("update", client['username'], {"auto_restart": auto_restart})
+    return run_job(job_id)
+
+def _update_header(username):
     print(f"\n{C.CYAN}{'═' * 60}{C.END}")
     print(f"{C.CYAN}  Updating: {username}{C.END}")
     print(f"{C.CYAN}{'═' * 60}{C.END}\n")
-    
-    # Check if directory exists
-    if not client_dir.exists():
-        print(f"{C.RED}❌ Client directory not found: {client_dir}{C.END}")
-        return False
-    
-    # Get current version
-    current_version = get_local_version(client_dir)
-    print(f"  Current version: {C.YELLOW}{current_version}{C.END}")
-    
-    # Check if bot was running
-    was_running = get_status(username) == 'online'
-    
-    # Step 1: Stop the bot if running
-    if was_running:
+
+def _update_stop(client, ctx):
+    username = client['username']
+    started = time.monotonic()
+    if ctx["was_running"]:
         print(f"\n{C.YELLOW}[1/6] Stopping bot...{C.END}")
-        os.system(f"pm2 stop {username} 2>/dev/null")
+        pm2_stop(username)
         print(f"  {C.GREEN}✅ Stopped{C.END}")
     else:
         print(f"\n{C.YELLOW}[1/6] Bot not running, skipping stop{C.END}")
-    
-    # Step 2: Backup session and important files
+    record_stage(ctx["run"], "stop", time.monotonic() - started)
+    return True
+
+def _update_preserve_backup(client, ctx):
     print(f"\n{C.YELLOW}[2/6] Backing up session & data...{C.END}")
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    temp_backup = BACKUP_DIR / f"temp_update_{username}_{timestamp}"
-    
-    backed_up = backup_preserved_items(client_dir, temp_backup)
+    started = time.monotonic()
+    size = new_sync_stats()
+    backed_up = backup_preserved_items(Path(client['directory']), Path(ctx["temp_backup"]), size)
+    record_stage(ctx["run"], "preserve_backup", time.monotonic() - started, size)
     if backed_up:
         print(f"  {C.GREEN}✅ Backed up: {', '.join(backed_up)}{C.END}")
+        print(f"     {sync_summary(size)}")
     else:
         print(f"  {C.YELLOW}⚠️ No session files found to backup{C.END}")
-    
-    # Step 3: Create full backup (safety)
+    return True
+
+def _update_safety_backup(client, ctx):
     print(f"\n{C.YELLOW}[3/6] Creating safety backup...{C.END}")
-    safety_backup = BACKUP_DIR / f"full_backup_{username}_{timestamp}"
+    safety_backup = Path(ctx["safety_backup"])
+    started = time.monotonic()
+    size = {"bytes": 0, "files": 0}
     try:
-        shutil.copytree(client_dir, safety_backup)
+        if ctx.get("resumed"):
+            # Drop the half-written copy from the interrupted attempt
+            shutil.rmtree(safety_backup, ignore_errors=True)
+        shutil.copytree(client['directory'], safety_backup, symlinks=True, copy_function=counting_copy(size))
+        record_backup([client['username']])
+        ctx["safety_ok"] = True
         print(f"  {C.GREEN}✅ Full backup: {safety_backup}{C.END}")
     except Exception as e:
+        ctx["safety_ok"] = False
         print(f"  {C.YELLOW}⚠️ Could not create full backup: {e}{C.END}")
-    
-    # Step 4: Remove old files and clone fresh
+    record_stage(ctx["run"], "safety_backup", time.monotonic() - started, size)
+    return True
+
+def _update_clone(client, ctx):
     print(f"\n{C.YELLOW}[4/6] Downloading latest version...{C.END}")
+    username = client['username']
+    client_dir = Path(client['directory'])
+    safety_backup = Path(ctx["safety_backup"])
+    started = time.monotonic()
     
     # Remove old directory
     try:
-        shutil.rmtree(client_dir)
+        if client_dir.exists():
+            shutil.rmtree(client_dir)
     except Exception as e:
         print(f"  {C.RED}❌ Could not remove old files: {e}{C.END}")
         # Restore from safety backup
         if safety_backup.exists():
-            shutil.copytree(safety_backup, client_dir)
+            shutil.rmtree(client_dir, ignore_errors=True)
+            shutil.copytree(safety_backup, client_dir, symlinks=True)
+        record_stage(ctx["run"], "clone", time.monotonic() - started)
         return False
     
     # Clone fresh
-    result = os.system(f"git clone {BOT_REPO} {client_dir} 2>&1")
-    if result != 0:
+    result = run_cmd(["git", "clone", BOT_REPO, client_dir], client=username, echo=True, background=True)
+    if result["code"] != 0:
+        if result["timed_out"]:
+            print(f"  {C.RED}❌ Clone timed out after {result['duration']:.0f}s{C.END}")
+        shutil.rmtree(client_dir, ignore_errors=True)
         print(f"  {C.RED}❌ Clone failed! Restoring from backup...{C.END}")
+        record_stage(ctx["run"], "clone", time.monotonic() - started)
         if safety_backup.exists():
-            shutil.copytree(safety_backup, client_dir)
+            shutil.copytree(safety_backup, client_dir, symlinks=True)
         return False
+    elapsed = time.monotonic() - started
+    bytes_, files = tree_size(client_dir)
+    record_stage(ctx["run"], "clone", elapsed, {"bytes": bytes_, "files": files})
     print(f"  {C.GREEN}✅ Downloaded latest version{C.END}")
-    
-    # Step 5: Restore session and important files
+    return True
+
+def _update_restore(client, ctx):
     print(f"\n{C.YELLOW}[5/6] Restoring session & data...{C.END}")
-    restored = restore_preserved_items(temp_backup, client_dir)
+    started = time.monotonic()
+    size = new_sync_stats()
+    # The temp backup is discarded afterwards, so items can be moved back
+    # (files hard-linked to the preserve mirror are copied instead)
+    restored = restore_preserved_items(Path(ctx["temp_backup"]), Path(client['directory']), size, move=True)
+    record_stage(ctx["run"], "restore", time.monotonic() - started, size)
     if restored:
         print(f"  {C.GREEN}✅ Restored: {', '.join(restored)}{C.END}")
+        print(f"     {sync_summary(size)}")
     else:
         print(f"  {C.YELLOW}⚠️ No files to restore{C.END}")
-    
-    # Step 6: Install dependencies
+    return True
+
+def _update_npm_install(client, ctx):
     print(f"\n{C.YELLOW}[6/6] Installing dependencies...{C.END}")
-    result = os.system(f"cd {client_dir} && npm install 2>&1 | tail -5")
-    if result != 0:
+    client_dir = Path(client['directory'])
+    started = time.monotonic()
+    result = run_cmd(["npm", "install"], cwd=client_dir, client=client['username'], background=True)
+    elapsed = time.monotonic() - started
+    bytes_, files = tree_size(client_dir / "node_modules")
+    record_stage(ctx["run"], "npm_install", elapsed, {"bytes": bytes_, "files": files})
+    if result["output"].strip():
+        print(tail_lines(result["output"]))
+    if result["code"] != 0:
         print(f"  {C.YELLOW}⚠️ npm install had warnings (usually OK){C.END}")
     else:
         print(f"  {C.GREEN}✅ Dependencies installed{C.END}")
-    
-    # Get new version
-    new_version = get_local_version(client_dir)
+    return True
+
+def _update_finish(client, ctx):
+    username = client['username']
+    new_version = get_local_version(client['directory'])
     
     # Clean up temp backup (keep safety backup for a while)
-    try:
-        shutil.rmtree(temp_backup)
-    except:
-        pass
+    shutil.rmtree(ctx["temp_backup"], ignore_errors=True)
     
     # Restart if was running
-    if was_running and auto_restart:
+    restart = ctx["was_running"] and ctx.get("auto_restart", True)
+    if restart:
         print(f"\n{C.CYAN}Restarting bot...{C.END}")
-        os.system(f"pm2 start {client_dir}/index.js --name {username} --cwd {client_dir} 2>/dev/null")
-        os.system("pm2 save 2>/dev/null")
+        pm2_start(client)
+        pm2_save()
         print(f"  {C.GREEN}✅ Bot restarted{C.END}")
     
     print(f"""
@@ -362,12 +1313,98 @@ def update_single_client(client, auto_restart=True):
 ║                    ✅ UPDATE COMPLETE!                         ║
 ╠════════════════════════════════════════════════════════════════╣{C.END}
 ║  Client    : {username:<50}║
-║  Version   : {current_version} → {new_version:<43}║
+║  Version   : {ctx['current_version']} → {new_version:<43}║
 ║  Session   : {C.GREEN}Preserved ✅{C.END}                                        ║
-║  Status    : {'Running 🟢' if was_running and auto_restart else 'Stopped 🔴':<50}║
+║  Status    : {'Running 🟢' if restart else 'Stopped 🔴':<50}║
 {C.GREEN}╚════════════════════════════════════════════════════════════════╝{C.END}
 """)
+    return True
+
+# Checkpointed steps of an update job, in order
+UPDATE_STEPS = [
+    ("stop", _update_stop),
+    ("preserve_backup", _update_preserve_backup),
+    ("safety_backup", _update_safety_backup),
+    ("clone", _update_clone),
+    ("restore", _update_restore),
+    ("npm_install", _update_npm_install),
+    ("finish", _update_finish),
+]
+
+# Steps that copy or install run at maintenance priority; stop/finish drive
+# PM2 at normal priority so a freshly spawned daemon doesn't inherit it
+THROTTLED_STEPS = {"preserve_backup", "safety_backup", "clone", "restore", "npm_install"}
+
+def run_update_job(job):
+    """Run (or continue) an update job from its last checkpoint"""
+    ctx = job["context"]
+    client = find_client(job["client"])
+    if not client:
+        print(f"{C.RED}❌ Unknown client {job['client']}{C.END}")
+        return False
+    username = client['username']
+    client_dir = Path(client['directory'])
+    _update_header(username)
+    
+    if "run" not in ctx:
+        # Check if directory exists
+        if not client_dir.exists():
+            print(f"{C.RED}❌ Client directory not found: {client_dir}{C.END}")
+            return False
+        run = new_update_run(username)
+        ctx.update({
+            "run": run,
+            "current_version": get_local_version(client_dir),
+            "was_running": get_status(username) == 'online',
+            "temp_backup": str(BACKUP_DIR / f"temp_update_{username}_{run['run_id']}"),
+            "safety_backup": str(BACKUP_DIR / f"full_backup_{username}_{run['run_id']}"),
+        })
+        checkpoint_job(job, None)
+    else:
+        ctx["resumed"] = True
+        print(f"  {C.YELLOW}Resuming after step: {job['step'] or 'start'}{C.END}")
+    
+    print(f"  Current version: {C.YELLOW}{ctx['current_version']}{C.END}")
+    
+    names = [name for name, _ in UPDATE_STEPS]
+    start = names.index(job["step"]) + 1 if job["step"] in names else 0
+    for name, step in UPDATE_STEPS[start:]:
+        with maintenance_priority() if name in THROTTLED_STEPS else suppress():
+            ok = step(client, ctx)
+        if not ok:
+            return finish_update_run(ctx["run"], False)
+        checkpoint_job(job, name)
+    return finish_update_run(ctx["run"], True)
+
+def rollback_update_job(job):
+    """Put an interrupted update back the way it was before it started"""
+    ctx = job["context"]
+    client = find_client(job["client"])
+    if not client or "run" not in ctx:
+        return True  # nothing was touched yet
+    client_dir = Path(client['directory'])
+    safety_backup = Path(ctx["safety_backup"])
+    temp_backup = Path(ctx["temp_backup"])
+    names = [name for name, _ in UPDATE_STEPS]
+    reached = names.index(job["step"]) if job["step"] in names else -1
     
+    print(f"\n{C.CYAN}Rolling back {client['username']} (last step: {job['step'] or 'start'})...{C.END}")
+    if reached >= names.index("safety_backup") and ctx.get("safety_ok") and safety_backup.exists():
+        shutil.rmtree(client_dir, ignore_errors=True)
+        shutil.copytree(safety_backup, client_dir, symlinks=True)
+        print(f"  {C.GREEN}✅ Restored {client_dir} from {safety_backup}{C.END}")
+    elif reached >= names.index("safety_backup"):
+        # No full copy: at least put sessions and data back
+        if temp_backup.exists() and client_dir.exists():
+            restore_preserved_items(temp_backup, client_dir)
+        print(f"  {C.YELLOW}⚠️ No safety backup; only session & data restored{C.END}")
+    shutil.rmtree(temp_backup, ignore_errors=True)
+    
+    if ctx.get("was_running"):
+        pm2_start(client)
+        pm2_save()
+        print(f"  {C.GREEN}✅ Bot restarted{C.END}")
+    finish_update_run(ctx["run"], False)
     return True
 
 def update_client():
@@ -470,9 +1507,14 @@ def update_all_clients():
     success_count = 0
     fail_count = 0
     
-    for client in data['clients']:
+    # Queue the whole batch first so an interruption leaves a record of
+    # which clients were never reached (resume with [21] or `jobs resume`)
+    batch = f"update-all-{datetime.now():%Y%m%d_%H%M%S}"
+    job_ids = [enqueue_job("update", c['username'], {"auto_restart": True}, batch) for c in data['clients']]
+    
+    for client, job_id in zip(data['clients'], job_ids):
         try:
-            if update_single_client(client):
+            if run_job(job_id):
                 success_count += 1
             else:
                 fail_count += 1
@@ -490,7 +1532,7 @@ def update_all_clients():
 {C.GREEN}╚════════════════════════════════════════════════════════════════╝{C.END}
 """)
     
-    os.system("pm2 save 2>/dev/null")
+    pm2_save()
     pause()
 
 def check_updates():
@@ -498,11 +1540,6 @@ def check_updates():
     banner()
     print(f"\n{C.CYAN}══════════════════ CHECK FOR UPDATES ══════════════════{C.END}\n")
     
-    print(f"{C.YELLOW}Checking GitHub for latest version...{C.END}\n")
-    
-    remote_version = get_remote_version()
-    print(f"  Latest version on GitHub: {C.GREEN}{remote_version}{C.END}\n")
-    
     data = load_clients()
     
     if not data['clients']:
@@ -510,81 +1547,903 @@ def check_updates():
         pause()
         return
     
-    print(f"{'Client':<20} {'Current':<15} {'Latest':<15} {'Status':<15}")
-    print("─" * 65)
-    
-    updates_available = []
-    
-    for client in data['clients']:
-        current = get_local_version(client['directory'])
-        
-        if current == remote_version:
-            status = f"{C.GREEN}✅ Up to date{C.END}"
-        elif current == 'unknown' or remote_version == 'unknown':
-            status = f"{C.YELLOW}❓ Unknown{C.END}"
-            updates_available.append(client)
-        else:
-            status = f"{C.RED}⬆️  Update available{C.END}"
-            updates_available.append(client)
-        
-        print(f"{client['username']:<20} {current:<15} {remote_version:<15} {status}")
+    print(f"{C.YELLOW}Fetching {BOT_REPO} into the local cache...{C.END}\n")
+    plan = plan_release(data['clients'])
+    if "error" in plan:
+        print(f"{C.RED}❌ {plan['error']}{C.END}")
+        pause()
+        return
     
-    print("─" * 65)
+    print_release_plan(plan)
     
-    if updates_available:
-        print(f"\n{C.YELLOW}{len(updates_available)} client(s) can be updated.{C.END}")
+    outdated = [r for r in plan["clients"] if not r["up_to_date"]]
+    if outdated:
+        npm = sum(1 for r in outdated if not r["diff"] or r["diff"]["npm"])
+        print(f"\n{C.YELLOW}{len(outdated)} client(s) can be updated ({npm} need npm install).{C.END}")
         print(f"Use option [13] to update single client or [14] to update all.")
     else:
         print(f"\n{C.GREEN}All clients are up to date! ✅{C.END}")
     
     pause()
 
+def update_report():
+    """Update stage timing report - menu option"""
+    banner()
+    print(f"\n{C.CYAN}══════════════════ UPDATE TIMING REPORT ══════════════════{C.END}\n")
+    
+    try:
+        days = int(input(f"{C.YELLOW}Days to include [30]: {C.END}").strip() or 30)
+    except ValueError:
+        days = 30
+    print()
+    print_stage_report(days)
+    print()
+    print_throttle_report(days)
+    pause()
+
 # ═══════════════════════════════════════════════════════════════
-# EXISTING FUNCTIONS (unchanged)
+# JOB QUEUE
 # ═══════════════════════════════════════════════════════════════
 
-def add_client():
-    """Add new client - Clone, Install, Run node index.js"""
-    banner()
-    print(f"\n{C.GREEN}══════════════════ ADD NEW CLIENT ══════════════════{C.END}\n")
-    
-    username = input(f"{C.YELLOW}Enter client username: {C.END}").strip().lower()
-    
-    if not username or not username.isalnum():
-        print(f"{C.RED}❌ Invalid username! Use letters and numbers only.{C.END}")
-        pause()
-        return
-    
-    data = load_clients()
-    if any(c['username'] == username for c in data['clients']):
-        print(f"{C.RED}❌ Client '{username}' already exists!{C.END}")
-        pause()
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT NOT NULL,
+    client      TEXT NOT NULL,
+    batch       TEXT,
+    status      TEXT NOT NULL,     -- queued running interrupted done failed rolled_back cancelled
+    step        TEXT,              -- last completed step
+    context     TEXT NOT NULL DEFAULT '{}',
+    not_before  REAL,              -- maintenance window, NULL = run now
+    not_after   REAL,
+    owner       TEXT,              -- host:pid of the process running it
+    heartbeat   REAL,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, not_before);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id  INTEGER NOT NULL,
+    step    TEXT,
+    at      REAL NOT NULL
+);
+"""
+
+@contextmanager
+def client_lock(username):
+    """Hold the per-client job lock (flock, so it covers every process and thread)"""
+    lock_dir = JOBS_DB.parent / "locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / f"{username}.lock", 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            print(f"{C.YELLOW}⏳ Waiting for another job on {username} to finish...{C.END}")
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+JOB_RUNNERS = {"update": run_update_job}
+JOB_ROLLBACKS = {"update": rollback_update_job}
+FINISHED_STATUSES = ("done", "failed", "rolled_back", "cancelled")
+
+_job_owner = f"{socket.gethostname()}:{os.getpid()}"
+_jobs_ready = set()
+_heartbeat_thread = None
+_job_worker_thread = None
+
+def jobs_db():
+    JOBS_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if JOBS_DB not in _jobs_ready:
+        conn.executescript(JOB_SCHEMA)
+        _jobs_ready.add(JOBS_DB)
+    return conn
+
+def _job(row):
+    job = dict(row)
+    job["context"] = json.loads(job["context"] or "{}")
+    return job
+
+def _heartbeat_loop():
+    # Jobs owned by a process that stops beating are interrupted
+    while True:
+        try:
+            with closing(jobs_db()) as conn, conn:
+                conn.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                             (time.time(), _job_owner))
+        except sqlite3.Error:
+            pass
+        time.sleep(JOB_HEARTBEAT)
+
+def _ensure_heartbeat():
+    global _heartbeat_thread
+    if _heartbeat_thread and _heartbeat_thread.is_alive():
         return
+    _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True)
+    _heartbeat_thread.start()
+
+def enqueue_job(kind, client, context=None, batch=None, window=None):
+    """Record a job; without a window it is owned by this process and run now"""
+    now = time.time()
+    not_before, not_after = window or (None, None)
+    owner = None if window else _job_owner
+    with closing(jobs_db()) as conn, conn:
+        cur = conn.execute(
+            "INSERT INTO jobs (kind, client, batch, status, context, not_before, not_after, owner, heartbeat, created_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (kind, client, batch, json.dumps(context or {}), not_before, not_after, owner, now, now))
+        job_id = cur.lastrowid
+    if owner:
+        _ensure_heartbeat()
+    return job_id
+
+def get_job(job_id):
+    with closing(jobs_db()) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _job(row) if row else None
+
+def list_jobs(limit=20, statuses=None):
+    query = "SELECT * FROM jobs"
+    params = []
+    if statuses:
+        query += f" WHERE status IN ({','.join('?' * len(statuses))})"
+        params = list(statuses)
+    query += " ORDER BY id DESC LIMIT ?"
+    with closing(jobs_db()) as conn:
+        return [_job(r) for r in conn.execute(query, params + [limit])]
+
+def interrupted_jobs():
+    """Jobs whose process died (or raised) before they finished"""
+    stale = time.time() - JOB_STALE
+    with closing(jobs_db()) as conn:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'interrupted' "
+            "OR (status IN ('queued', 'running') AND owner IS NOT NULL AND owner != ? AND heartbeat < ?) "
+            "ORDER BY id", (_job_owner, stale)).fetchall()
+    return [_job(r) for r in rows]
+
+def claim_job(job_id):
+    """Take ownership of a job; False if someone alive already has it"""
+    now = time.time()
+    with closing(jobs_db()) as conn, conn:
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, heartbeat = ?, started_at = COALESCE(started_at, ?) "
+            "WHERE id = ? AND (status = 'interrupted' OR (status IN ('queued', 'running') "
+            "AND (owner IS NULL OR owner = ? OR heartbeat < ?)))",
+            (_job_owner, now, now, job_id, _job_owner, now - JOB_STALE))
+        claimed = cur.rowcount == 1
+    if claimed:
+        _ensure_heartbeat()
+    return claimed
+
+def checkpoint_job(job, step):
+    """Persist progress after a step completes"""
+    job["step"] = step
+    now = time.time()
+    with closing(jobs_db()) as conn, conn:
+        conn.execute("UPDATE jobs SET step = ?, context = ?, heartbeat = ? WHERE id = ?",
+                     (step, json.dumps(job["context"]), now, job["id"]))
+        conn.execute("INSERT INTO checkpoints (job_id, step, at) VALUES (?, ?, ?)", (job["id"], step, now))
+
+def finish_job(job_id, status, error=None):
+    with closing(jobs_db()) as conn, conn:
+        conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, owner = NULL WHERE id = ?",
+                     (status, error, time.time(), job_id))
+
+def run_job(job_id):
+    """Claim and run (or continue) a job; returns True on success"""
+    if not claim_job(job_id):
+        return False
+    job = get_job(job_id)
+    try:
+        with client_lock(job["client"]):
+            ok = JOB_RUNNERS[job["kind"]](job)
+    except BaseException as e:
+        # Keep the checkpoint so the job can be resumed or rolled back;
+        # Ctrl-C included, so the next start offers to resume right away
+        finish_job(job_id, "interrupted", f"{type(e).__name__}: {e}")
+        raise
+    finish_job(job_id, "done" if ok else "failed")
+    return ok
+
+def rollback_job(job_id):
+    if not claim_job(job_id):
+        return False
+    job = get_job(job_id)
+    try:
+        with client_lock(job["client"]):
+            JOB_ROLLBACKS[job["kind"]](job)
+    except BaseException as e:
+        finish_job(job_id, "interrupted", f"rollback failed: {type(e).__name__}: {e}")
+        raise
+    finish_job(job_id, "rolled_back")
+    return True
+
+def cancel_jobs(job_ids=None):
+    """Cancel queued jobs (all scheduled ones by default)"""
+    with closing(jobs_db()) as conn, conn:
+        if job_ids:
+            marks = ','.join('?' * len(job_ids))
+            cur = conn.execute(f"UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                               f"WHERE status = 'queued' AND id IN ({marks})", [time.time(), *job_ids])
+        else:
+            cur = conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                               "WHERE status = 'queued' AND owner IS NULL", (time.time(),))
+        return cur.rowcount
+
+def resume_jobs(rollback=False, report=print):
+    """Continue (or roll back) every interrupted job; returns (ok, failed)"""
+    ok = failed = 0
+    for job in interrupted_jobs():
+        verb = "Rolling back" if rollback else "Resuming"
+        report(f"{C.CYAN}{verb} job #{job['id']} ({job['kind']} {job['client']}, last step: {job['step'] or '-'}){C.END}")
+        try:
+            done = rollback_job(job["id"]) if rollback else run_job(job["id"])
+        except Exception as e:
+            report(f"{C.RED}❌ Job #{job['id']}: {e}{C.END}")
+            done = False
+        if done:
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed
+
+# ── Maintenance window ─────────────────────────────────────────
+
+def next_window(spec=None, now=None):
+    """(start, end) timestamps of the current or next "HH:MM-HH:MM" window"""
+    spec = spec or MAINTENANCE_WINDOW
+    now = datetime.now() if now is None else now
+    begin, end = [datetime.strptime(t.strip(), "%H:%M").time() for t in spec.split("-")]
+    for days in (-1, 0, 1):
+        day = now.date().toordinal() + days
+        start = datetime.combine(datetime.fromordinal(day).date(), begin)
+        stop = datetime.combine(datetime.fromordinal(day + (1 if end <= begin else 0)).date(), end)
+        if now < stop:
+            return max(start, now).timestamp(), stop.timestamp()
+    raise ValueError(f"bad maintenance window: {spec}")
+
+def schedule_updates(clients, spec=None):
+    """Queue an update job per client for the next maintenance window"""
+    window = next_window(spec)
+    batch = f"window-{datetime.fromtimestamp(window[0]):%Y%m%d_%H%M}"
+    ids = [enqueue_job("update", c['username'], {"auto_restart": True}, batch, window) for c in clients]
+    return ids, window
+
+def due_jobs():
+    """Scheduled jobs whose window is open, oldest first"""
+    now = time.time()
+    with closing(jobs_db()) as conn:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND owner IS NULL AND not_before <= ? ORDER BY id",
+            (now,)).fetchall()
+    return [_job(r) for r in rows]
+
+def run_due_jobs(report=print):
+    """Run scheduled jobs inside their window; late ones move to the next window"""
+    ran = 0
+    for job in due_jobs():
+        if job["not_after"] and time.time() > job["not_after"]:
+            start, end = next_window()
+            with closing(jobs_db()) as conn, conn:
+                conn.execute("UPDATE jobs SET not_before = ?, not_after = ? WHERE id = ? AND status = 'queued'",
+                             (start, end, job["id"]))
+            report(f"Job #{job['id']} missed its window, moved to {datetime.fromtimestamp(start):%Y-%m-%d %H:%M}")
+            continue
+        try:
+            run_job(job["id"])
+        except Exception as e:
+            report(f"Job #{job['id']} interrupted: {e}")
+        ran += 1
+    return ran
+
+def _job_worker_loop(interval, report):
+    while True:
+        try:
+            run_due_jobs(report)
+        except Exception as e:
+            sys.stderr.write(f"[jobs] worker pass failed: {e}\n")
+        time.sleep(interval)
+
+def start_job_worker(interval=JOB_POLL, report=print):
+    global _job_worker_thread
+    if _job_worker_thread and _job_worker_thread.is_alive():
+        return
+    _job_worker_thread = threading.Thread(target=_job_worker_loop, args=(interval, report),
+                                          name="job-worker", daemon=True)
+    _job_worker_thread.start()
+
+def _fmt_ts(ts):
+    return datetime.fromtimestamp(ts).strftime('%m-%d %H:%M') if ts else "-"
+
+def print_jobs(jobs):
+    print(f"{'ID':<6} {'Job':<8} {'Client':<18} {'Status':<12} {'Step':<16} {'Scheduled':<12} {'Finished':<12}")
+    print("─" * 86)
+    colors = {"done": C.GREEN, "failed": C.RED, "interrupted": C.YELLOW, "running": C.CYAN}
+    for job in jobs:
+        color = colors.get(job["status"], C.WHITE)
+        print(f"{job['id']:<6} {job['kind']:<8} {job['client']:<18} {color}{job['status']:<12}{C.END} "
+              f"{job['step'] or '-':<16} {_fmt_ts(job['not_before']):<12} {_fmt_ts(job['finished_at']):<12}")
+    print("─" * 86)
+
+def jobs_menu():
+    """Jobs & scheduled updates - menu option"""
+    banner()
+    print(f"\n{C.BLUE}══════════════════ JOBS & SCHEDULED UPDATES ══════════════════{C.END}\n")
     
-    client_dir = BASE_DIR / username
+    print_jobs(list_jobs(15))
+    interrupted = interrupted_jobs()
+    start, end = next_window()
+    print(f"Maintenance window: {C.CYAN}{MAINTENANCE_WINDOW}{C.END} "
+          f"(next: {datetime.fromtimestamp(start):%Y-%m-%d %H:%M})")
     
-    print(f"\n{C.CYAN}[1/3] Cloning repository...{C.END}\n")
-    print("─" * 60)
+    if interrupted:
+        print(f"\n{C.YELLOW}⚠️  {len(interrupted)} interrupted job(s):{C.END}")
+        for job in interrupted:
+            print(f"  #{job['id']} {job['kind']} {job['client']} - last step: {job['step'] or '-'}")
     
-    if os.system(f"git clone {BOT_REPO} {client_dir}") != 0:
-        print(f"\n{C.RED}❌ Clone failed!{C.END}")
-        shutil.rmtree(client_dir, ignore_errors=True)
+    print(f"""
+  {C.YELLOW}[r]{C.END} Resume interrupted jobs     {C.YELLOW}[b]{C.END} Roll back interrupted jobs
+  {C.YELLOW}[s]{C.END} Schedule updates for window {C.YELLOW}[c]{C.END} Cancel scheduled updates
+""")
+    choice = input(f"{C.CYAN}Select (Enter to go back): {C.END}").strip().lower()
+    
+    if choice in ('r', 'b'):
+        ok, failed = resume_jobs(rollback=choice == 'b')
+        print(f"\n{C.GREEN}✅ {ok} done{C.END}, {C.RED}❌ {failed} failed{C.END}")
+    elif choice == 's':
+        clients = load_clients()['clients']
+        if input(f"{C.YELLOW}All {len(clients)} clients? (y/n): {C.END}").lower() != 'y':
+            client = select_client()
+            clients = [client] if client else []
+        if clients:
+            ids, (start, end) = schedule_updates(clients)
+            print(f"\n{C.GREEN}✅ {len(ids)} update(s) scheduled for "
+                  f"{datetime.fromtimestamp(start):%Y-%m-%d %H:%M} - {datetime.fromtimestamp(end):%H:%M}{C.END}")
+            print(f"{C.YELLOW}They run in the agent, or via 'chairman.py jobs worker'.{C.END}")
+    elif choice == 'c':
+        print(f"\n{C.GREEN}✅ Cancelled {cancel_jobs()} scheduled job(s){C.END}")
+    else:
+        return
+    pause()
+
+# ═══════════════════════════════════════════════════════════════
+# RELEASE PLANNER
+# ═══════════════════════════════════════════════════════════════
+
+# package.json sections whose change means `npm install` must run
+DEPENDENCY_KEYS = ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies", "overrides")
+_diff_cache = {}
+
+def cache_git(*args, **kwargs):
+    return run_cmd(["git", "--git-dir", REPO_CACHE, *args], log=False, **kwargs)
+
+def sync_repo_cache(force=False):
+    """Mirror BOT_REPO into REPO_CACHE, fetching at most every REPO_CACHE_TTL s"""
+    if not (REPO_CACHE / "HEAD").exists():
+        REPO_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        result = run_cmd(["git", "clone", "--mirror", "--quiet", BOT_REPO, REPO_CACHE], client="chairman", background=True)
+        return result["code"] == 0
+    fetched = REPO_CACHE / "FETCH_HEAD"
+    if not force and fetched.exists() and time.time() - fetched.stat().st_mtime < REPO_CACHE_TTL:
+        return True
+    return cache_git("fetch", "--prune", "--quiet", client="chairman", background=True)["code"] == 0
+
+def read_head_commit(client_dir):
+    """Checked-out commit of a client, read straight from .git (no git process)"""
+    git_dir = Path(client_dir) / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[5:]
+        if (git_dir / ref).exists():
+            return (git_dir / ref).read_text().strip()
+        for line in (git_dir / "packed-refs").read_text().splitlines():
+            if line.endswith(" " + ref):
+                return line.split()[0]
+    except OSError:
+        pass
+    return None
+
+def _package_deps(commit):
+    result = cache_git("show", f"{commit}:package.json")
+    try:
+        package = json.loads(result["output"]) if result["code"] == 0 else {}
+    except ValueError:
+        package = {}
+    return {key: package.get(key) for key in DEPENDENCY_KEYS}, package.get("version", "unknown")
+
+def diff_commits(base, target):
+    """What updating from `base` to `target` changes (cached per pair)"""
+    key = (base, target)
+    if key in _diff_cache:
+        return _diff_cache[key]
+    
+    if cache_git("cat-file", "-e", f"{base}^{{commit}}")["code"] != 0:
+        diff = {"known": False, "behind": None, "commits": [], "files": [], "npm": True}
+    else:
+        behind = cache_git("rev-list", "--count", f"{base}..{target}")["output"].strip()
+        ahead = cache_git("rev-list", "--count", f"{target}..{base}")["output"].strip()
+        log = cache_git("log", "--format=%h %s", f"{base}..{target}")["output"].splitlines()
+        files = [line.split("\t") for line in cache_git("diff", "--name-status", base, target)["output"].splitlines()]
+        names = {f[-1] for f in files}
+        npm = "package-lock.json" in names or (
+            "package.json" in names and _package_deps(base)[0] != _package_deps(target)[0])
+        diff = {
+            "known": True,
+            "behind": int(behind or 0),
+            "ahead": int(ahead or 0),
+            "commits": log,
+            "files": [(f[0], f[-1]) for f in files if len(f) >= 2],
+            "npm": npm,
+        }
+    _diff_cache[key] = diff
+    return diff
+
+def plan_release(clients=None, target=None):
+    """Per-client update plan against `target` (default: the repo's HEAD).
+
+    Returns {"target", "version", "clients": [...], "groups": {commit: diff}},
+    or {"error": message} when the cache can't be fetched or `target`
+    doesn't name a commit. Diffs are computed once per distinct
+    checked-out commit.
+    """
+    clients = load_clients()['clients'] if clients is None else clients
+    if not sync_repo_cache():
+        return {"error": f"could not fetch {BOT_REPO}; see {LOG_DIR / 'chairman.log'}"}
+    resolved = cache_git("rev-parse", "--verify", "--quiet", f"{target or 'HEAD'}^{{commit}}")
+    if resolved["code"] != 0 or not re.fullmatch(r"[0-9a-f]{40,64}", resolved["output"].strip()):
+        return {"error": f"unknown target revision: {target or 'HEAD'}"}
+    target = resolved["output"].strip()
+    
+    heads = {c['username']: read_head_commit(c['directory']) for c in clients}
+    distinct = sorted({h for h in heads.values() if h and h != target})
+    diffs = dict(zip(distinct, run_parallel(lambda h: diff_commits(h, target), distinct)))
+    
+    rows = []
+    for client in clients:
+        head = heads[client['username']]
+        diff = diffs.get(head)
+        if isinstance(diff, Exception):
+            diff = None
+        rows.append({
+            "username": client['username'],
+            "version": cached_local_version(client['directory']),
+            "commit": head,
+            "up_to_date": head == target,
+            "diff": diff,
+        })
+    return {
+        "target": target,
+        "version": _package_deps(target)[1],
+        "clients": rows,
+        "groups": {h: d for h, d in diffs.items() if not isinstance(d, Exception)},
+    }
+
+def print_release_plan(plan, files=15, commits=10):
+    """Fleet table, then one section per distinct commit being updated from"""
+    print(f"  Target: {C.GREEN}{plan['target'][:10]}{C.END} (version {plan['version']})\n")
+    print(f"{'Client':<20} {'Version':<10} {'Commit':<10} {'Behind':>7} {'Files':>6}  {'npm':<5} Status")
+    print("─" * 80)
+    for row in plan["clients"]:
+        diff = row["diff"]
+        commit = row["commit"][:8] if row["commit"] else "-"
+        if row["up_to_date"]:
+            behind, nfiles, npm, status = "0", "0", "-", f"{C.GREEN}✅ Up to date{C.END}"
+        elif not row["commit"]:
+            behind, nfiles, npm, status = "?", "?", "yes", f"{C.YELLOW}❓ No git checkout{C.END}"
+        elif not diff or not diff["known"]:
+            behind, nfiles, npm, status = "?", "?", "yes", f"{C.YELLOW}❓ Commit not upstream{C.END}"
+        else:
+            behind, nfiles = str(diff["behind"]), str(len(diff["files"]))
+            npm = "yes" if diff["npm"] else "no"
+            status = f"{C.RED}⬆️  Update available{C.END}"
+            if diff.get("ahead"):
+                status += f" {C.YELLOW}({diff['ahead']} local){C.END}"
+        print(f"{row['username']:<20} {row['version'][:10]:<10} {commit:<10} {behind:>7} {nfiles:>6}  {npm:<5} {status}")
+    print("─" * 80)
+    
+    for head, diff in plan["groups"].items():
+        if not diff["known"]:
+            continue
+        users = [r["username"] for r in plan["clients"] if r["commit"] == head]
+        npm = f"{C.YELLOW}npm install needed{C.END}" if diff["npm"] else f"{C.GREEN}no dependency changes{C.END}"
+        print(f"\n{C.CYAN}{head[:8]} → {plan['target'][:8]}{C.END}: {len(users)} client(s), "
+              f"{diff['behind']} commit(s), {len(diff['files'])} file(s), {npm}")
+        for line in diff["commits"][:commits]:
+            print(f"    {line[:76]}")
+        if len(diff["commits"]) > commits:
+            print(f"    … {len(diff['commits']) - commits} more")
+        for status, name in diff["files"][:files]:
+            print(f"      {status:<2} {name}")
+        if len(diff["files"]) > files:
+            print(f"      … {len(diff['files']) - files} more files")
+
+# ═══════════════════════════════════════════════════════════════
+# SPARE POOL
+# ═══════════════════════════════════════════════════════════════
+
+_pool_lock = threading.Lock()
+_pool_thread = None
+
+def pool_dir(root=None):
+    # One pool per storage root, so claiming is always a same-volume rename
+    return Path(root or BASE_DIR) / ".pool"
+
+def list_spares(root=None):
+    """Ready spares, oldest first: [(path, marker)]"""
+    spares = []
+    if not pool_dir(root).exists():
+        return spares
+    for path in pool_dir(root).iterdir():
+        marker = path / ".spare.json"
+        if path.name.startswith("spare-") and marker.exists():
+            try:
+                spares.append((path, json.loads(marker.read_text())))
+            except (OSError, ValueError):
+                continue
+    return sorted(spares, key=lambda s: s[1].get("created_at", ""))
+
+def _spare_is_stale(marker):
+    try:
+        created = datetime.fromisoformat(marker["created_at"])
+    except (KeyError, ValueError):
+        return True
+    return (datetime.now() - created).days >= POOL_MAX_AGE_DAYS
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def _clean_pool(root=None):
+    """Drop stale spares and half-built ones left by a dead chairman"""
+    for path, marker in list_spares(root):
+        if _spare_is_stale(marker):
+            shutil.rmtree(path, ignore_errors=True)
+    for path in pool_dir(root).glob(".building-*"):
+        try:
+            pid = int(path.name.split("-")[1])
+        except (IndexError, ValueError):
+            pid = 0
+        if not _pid_alive(pid):
+            shutil.rmtree(path, ignore_errors=True)
+
+def provision_spare(root=None):
+    """Clone and npm install one spare; returns its path or None"""
+    pool_dir(root).mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    building = pool_dir(root) / f".building-{os.getpid()}-{stamp}"
+    
+    if run_cmd(["git", "clone", BOT_REPO, building], client="pool", background=True)["code"] != 0:
+        shutil.rmtree(building, ignore_errors=True)
+        return None
+    if run_cmd(["npm", "install"], cwd=building, client="pool", background=True)["code"] != 0:
+        shutil.rmtree(building, ignore_errors=True)
+        return None
+    
+    marker = {"created_at": datetime.now().isoformat(), "version": get_local_version(building)}
+    (building / ".spare.json").write_text(json.dumps(marker))
+    spare = pool_dir(root) / f"spare-{stamp}"
+    os.rename(building, spare)
+    return spare
+
+def refill_pool(target=None):
+    """Provision spares until every storage root's pool holds `target` (POOL_SIZE)"""
+    target = POOL_SIZE if target is None else target
+    if not _pool_lock.acquire(blocking=False):
+        return 0
+    try:
+        added = 0
+        for root in storage_roots():
+            pool_dir(root).mkdir(parents=True, exist_ok=True)
+            _clean_pool(root)
+            failures = 0
+            while len(list_spares(root)) < target and failures < 2:
+                if provision_spare(root):
+                    added += 1
+                else:
+                    failures += 1
+        return added
+    finally:
+        _pool_lock.release()
+
+def refill_pool_async():
+    """Refill the pool on a background thread (no-op if one is running)"""
+    global _pool_thread
+    if POOL_SIZE <= 0 or (_pool_thread and _pool_thread.is_alive()):
+        return
+    _pool_thread = threading.Thread(target=refill_pool, name="pool-refill", daemon=True)
+    _pool_thread.start()
+
+def claim_spare(dest, username):
+    """Move a ready spare to dest and bring it to the current release.
+
+    Returns False when no spare could be claimed; the caller then falls
+    back to a fresh clone.
+    """
+    for path, marker in list_spares(Path(dest).parent):
+        if _spare_is_stale(marker):
+            continue
+        try:
+            os.rename(path, dest)  # atomic: only one claimer wins
+        except OSError:
+            continue
+        (Path(dest) / ".spare.json").unlink(missing_ok=True)
+        
+        manifests = [Path(dest) / "package.json", Path(dest) / "package-lock.json"]
+        before = [file_digest(m) if m.exists() else None for m in manifests]
+        if run_cmd(["git", "pull", "--ff-only"], cwd=dest, client=username, background=True)["code"] != 0:
+            # Diverged or unreachable: a stale release is worse than a fresh clone
+            shutil.rmtree(dest, ignore_errors=True)
+            return False
+        after = [file_digest(m) if m.exists() else None for m in manifests]
+        if before != after:
+            if run_cmd(["npm", "install"], cwd=dest, client=username, background=True)["code"] != 0:
+                shutil.rmtree(dest, ignore_errors=True)
+                return False
+        return True
+    return False
+
+def pool_status():
+    """Spare pool status - menu option"""
+    banner()
+    print(f"\n{C.BLUE}══════════════════ SPARE POOL ══════════════════{C.END}\n")
+    
+    refilling = _pool_thread is not None and _pool_thread.is_alive()
+    print(f"  Target size    : {POOL_SIZE} per volume")
+    print(f"  Refilling      : {'yes' if refilling else 'no'}")
+    
+    short = False
+    for root in storage_roots():
+        spares = list_spares(root)
+        short = short or len(spares) < POOL_SIZE
+        print(f"\n  {C.CYAN}{pool_dir(root)}{C.END}  ({len(spares)} ready)")
+        for path, marker in spares:
+            stale = f" {C.YELLOW}(stale){C.END}" if _spare_is_stale(marker) else ""
+            print(f"  • {path.name:<32} v{marker.get('version', '?'):<10} {marker.get('created_at', '')[:16]}{stale}")
+    
+    if short and not refilling:
+        if input(f"\n{C.YELLOW}Refill pool now in background? (y/n): {C.END}").lower() == 'y':
+            refill_pool_async()
+            print(f"{C.GREEN}✅ Refill started{C.END}")
+    pause()
+
+# ═══════════════════════════════════════════════════════════════
+# STORAGE VOLUMES
+# ═══════════════════════════════════════════════════════════════
+
+def storage_roots():
+    roots = [Path(BASE_DIR)]
+    for root in STORAGE_ROOTS:
+        if Path(root) not in roots:
+            roots.append(Path(root))
+    return roots
+
+def root_of(client):
+    """The storage root a client's directory lives under"""
+    directory = Path(client['directory'])
+    for root in storage_roots():
+        if directory.parent == root:
+            return root
+    return directory.parent
+
+def volume_stats(clients=None):
+    """[{root, total, used, free, clients, online}] for every storage root"""
+    clients = load_clients()['clients'] if clients is None else clients
+    processes = pm2_processes()
+    stats = []
+    for root in storage_roots():
+        if not root.is_dir():
+            continue  # not mounted / not created yet; reading must not create it
+        usage = shutil.disk_usage(root)
+        here = [c for c in clients if root_of(c) == root]
+        stats.append({
+            "root": root,
+            "total": usage.total,
+            "used": usage.used,
+            "free": usage.free,
+            "clients": len(here),
+            "online": sum(1 for c in here if get_status(c['username'], processes) == 'online'),
+        })
+    return stats
+
+def choose_storage_root(policy=None):
+    """Pick a root for a new client according to PLACEMENT_POLICY"""
+    policy = policy or PLACEMENT_POLICY
+    stats = volume_stats()
+    if not stats:
+        return Path(BASE_DIR)
+    if len(stats) == 1:
+        return stats[0]["root"]
+    
+    if policy == "pinned":
+        print(f"\n{C.CYAN}Choose a storage volume:{C.END}\n")
+        for i, v in enumerate(stats, 1):
+            print(f"  [{i}] {v['root']}  {fmt_bytes(v['free'])} free, {v['clients']} clients")
+        try:
+            choice = int(input(f"\n{C.YELLOW}Enter number [1]: {C.END}").strip() or 1)
+            return stats[choice - 1]["root"]
+        except (ValueError, IndexError):
+            return stats[0]["root"]
+    if policy == "least-loaded":
+        return min(stats, key=lambda v: (v["online"], v["clients"], -v["free"]))["root"]
+    # least-used: lowest fraction of the volume in use
+    return min(stats, key=lambda v: (v["used"] / v["total"] if v["total"] else 1, -v["free"]))["root"]
+
+def migrate_client(client, dest_root, report=print):
+    """Move a client to another storage root with minimal downtime.
+
+    The tree is pre-copied while the bot keeps running, then the bot is
+    stopped for a final change-only sync (or a plain rename on the same
+    filesystem), the registry is updated and PM2 restarted with the new
+    cwd. Returns the downtime in seconds, or None on failure.
+    """
+    username = client['username']
+    src = Path(client['directory'])
+    dest_root = Path(dest_root)
+    dest = dest_root / username
+    staging = dest_root / f".migrating-{username}"
+    
+    if dest.exists():
+        report(f"{C.RED}❌ {dest} already exists{C.END}")
+        return None
+    dest_root.mkdir(parents=True, exist_ok=True)
+    same_fs = os.stat(src).st_dev == os.stat(dest_root).st_dev
+    
+    if not same_fs:
+        report(f"{C.CYAN}Pre-copying {src} → {dest} (bot keeps running)...{C.END}")
+        stats = new_sync_stats()
+        try:
+            with maintenance_priority():
+                sync_item(src, staging, stats)
+        except Exception as e:
+            report(f"{C.RED}❌ Pre-copy failed: {e}{C.END}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+        report(f"  {sync_summary(stats)}")
+    
+    was_running = get_status(username) == 'online'
+    downtime_start = time.monotonic()
+    if was_running:
+        pm2_stop(username)
+    
+    try:
+        if same_fs:
+            os.rename(src, dest)
+        else:
+            stats = new_sync_stats()
+            sync_item(src, staging, stats)
+            report(f"  Final sync: {sync_summary(stats)}")
+            os.rename(staging, dest)
+    except Exception as e:
+        report(f"{C.RED}❌ Migration failed: {e}{C.END}")
+        shutil.rmtree(staging, ignore_errors=True)
+        if was_running:
+            pm2_start(client)
+        return None
+    
+    data = load_clients()
+    for c in data['clients']:
+        if c['username'] == username:
+            c['directory'] = str(dest)
+    save_clients(data)
+    
+    # PM2 cannot change a process's cwd, so re-register it
+    moved = dict(client, directory=str(dest))
+    pm2("delete", username, client=username)
+    if was_running:
+        pm2_start(moved)
+    pm2_save()
+    downtime = time.monotonic() - downtime_start
+    
+    if not same_fs:
+        shutil.rmtree(src, ignore_errors=True)
+    report(f"{C.GREEN}✅ {username} now lives in {dest} (downtime {downtime:.1f}s){C.END}")
+    return downtime
+
+def storage_volumes():
+    """Storage volumes - menu option"""
+    banner()
+    print(f"\n{C.BLUE}══════════════════ STORAGE VOLUMES ══════════════════{C.END}\n")
+    
+    stats = volume_stats()
+    print(f"Placement policy: {C.CYAN}{PLACEMENT_POLICY}{C.END}\n")
+    print(f"{'#':<4} {'Volume':<32} {'Free':>10} {'Used':>6} {'Clients':>8} {'Online':>7}")
+    print("─" * 72)
+    for i, v in enumerate(stats, 1):
+        pct = v["used"] / v["total"] * 100 if v["total"] else 0
+        print(f"{i:<4} {str(v['root']):<32} {fmt_bytes(v['free']):>10} {pct:>5.0f}% {v['clients']:>8} {v['online']:>7}")
+    print("─" * 72)
+    for root in storage_roots():
+        if not root.is_dir():
+            print(f"{C.YELLOW}⚠️  {root} does not exist (not mounted?) - skipped{C.END}")
+    
+    if len(stats) < 2:
+        print(f"\n{C.YELLOW}Add more volumes to STORAGE_ROOTS to spread clients out.{C.END}")
         pause()
         return
     
-    print("\n" + "─" * 60)
-    print(f"{C.GREEN}✅ Cloned!{C.END}\n")
+    if input(f"\n{C.YELLOW}Migrate a client to another volume? (y/n): {C.END}").lower() != 'y':
+        return
+    client = select_client()
+    if not client:
+        pause()
+        return
+    try:
+        choice = int(input(f"{C.YELLOW}Destination volume number: {C.END}"))
+        dest_root = stats[choice - 1]["root"]
+    except (ValueError, IndexError):
+        print(f"{C.RED}Invalid choice!{C.END}")
+        pause()
+        return
+    if dest_root == root_of(client):
+        print(f"{C.YELLOW}{client['username']} is already on that volume.{C.END}")
+    else:
+        print()
+        migrate_client(client, dest_root)
+    pause()
+
+# ═══════════════════════════════════════════════════════════════
+# EXISTING FUNCTIONS (unchanged)
+# ═══════════════════════════════════════════════════════════════
+
+def add_client():
+    """Add new client - Clone, Install, Run node index.js"""
+    banner()
+    print(f"\n{C.GREEN}══════════════════ ADD NEW CLIENT ══════════════════{C.END}\n")
     
-    print(f"{C.CYAN}[2/3] Installing dependencies...{C.END}\n")
-    print("─" * 60)
+    username = input(f"{C.YELLOW}Enter client username: {C.END}").strip().lower()
     
-    if os.system(f"cd {client_dir} && npm install") != 0:
-        print(f"\n{C.RED}❌ Install failed!{C.END}")
+    if not username or not username.isalnum():
+        print(f"{C.RED}❌ Invalid username! Use letters and numbers only.{C.END}")
         pause()
         return
     
-    print("\n" + "─" * 60)
-    print(f"{C.GREEN}✅ Installed!{C.END}\n")
+    data = load_clients()
+    if any(c['username'] == username for c in data['clients']):
+        print(f"{C.RED}❌ Client '{username}' already exists!{C.END}")
+        pause()
+        return
+    
+    client_dir = choose_storage_root() / username
+    
+    print(f"\n{C.CYAN}[1/3] Claiming pre-installed spare...{C.END}")
+    if claim_spare(client_dir, username):
+        print(f"{C.GREEN}✅ Ready! (spare from pool, dependencies already installed){C.END}\n")
+        refill_pool_async()
+    else:
+        print(f"{C.YELLOW}No spare available, cloning fresh.{C.END}\n")
+        print(f"{C.CYAN}[1/3] Cloning repository...{C.END}\n")
+        print("─" * 60)
+        
+        if run_cmd(["git", "clone", BOT_REPO, client_dir], client=username, echo=True, background=True)["code"] != 0:
+            print(f"\n{C.RED}❌ Clone failed!{C.END}")
+            shutil.rmtree(client_dir, ignore_errors=True)
+            pause()
+            return
+        
+        print("\n" + "─" * 60)
+        print(f"{C.GREEN}✅ Cloned!{C.END}\n")
+        
+        print(f"{C.CYAN}[2/3] Installing dependencies...{C.END}\n")
+        print("─" * 60)
+        
+        if run_cmd(["npm", "install"], cwd=client_dir, client=username, echo=True, background=True)["code"] != 0:
+            print(f"\n{C.RED}❌ Install failed!{C.END}")
+            pause()
+            return
+        
+        print("\n" + "─" * 60)
+        print(f"{C.GREEN}✅ Installed!{C.END}\n")
     
     # Save client
     client_info = {
@@ -600,7 +2459,7 @@ def add_client():
 ║                  ✅ CLIENT SETUP COMPLETE!                     ║
 ╠════════════════════════════════════════════════════════════════╣{C.END}
 ║  Username  : {username:<50}║
-║  Directory : /root/clients/{username:<35}║
+║  Directory : {str(client_dir):<50}║
 {C.GREEN}╠════════════════════════════════════════════════════════════════╣
 ║                                                                ║
 ║  {C.WHITE}[3/3] RUNNING BOT - SCAN QR CODE NOW!{C.GREEN}                        ║
@@ -620,7 +2479,7 @@ def add_client():
     print("═" * 60 + "\n")
     
     # Run node index.js interactively
-    os.system(f"cd {client_dir} && node index.js")
+    run_cmd(["node", "index.js"], cwd=client_dir, client=username, interactive=True)
     
     print("\n" + "═" * 60)
     print(f"\n{C.GREEN}✅ Setup complete!{C.END}")
@@ -638,13 +2497,18 @@ def view_clients():
         pause()
         return
     
+    processes = pm2_processes()
+    offenders = crash_loop_report(processes)
+    
     print(f"{'#':<4} {'Username':<20} {'Status':<12} {'Version':<12} {'Created':<12}")
     print("─" * 65)
     
     for i, client in enumerate(data['clients'], 1):
-        status = get_status(client['username'])
+        status = get_status(client['username'], processes)
         version = get_local_version(client['directory'])
-        if status == 'online':
+        if client['username'] in offenders:
+            st = f"{C.YELLOW}● {offenders[client['username']]['state']}{C.END}"
+        elif status == 'online':
             st = f"{C.GREEN}● Online{C.END}"
         else:
             st = f"{C.RED}● Stopped{C.END}"
@@ -653,6 +2517,13 @@ def view_clients():
     
     print("─" * 65)
     print(f"Total: {len(data['clients'])} clients")
+    
+    if offenders:
+        print(f"\n{C.YELLOW}⚠️  Crash-looping clients:{C.END}")
+        for username, info in offenders.items():
+            print(f"\n  {C.YELLOW}{username}{C.END} - {info['summary']}")
+            for line in info['errors']:
+                print(f"    {C.RED}│{C.END} {line[:100]}")
     pause()
 
 def start_client():
@@ -669,8 +2540,8 @@ def start_client():
     
     print(f"\n{C.CYAN}Starting {username} with PM2...{C.END}\n")
     
-    os.system(f"pm2 start {client_dir}/index.js --name {username} --cwd {client_dir}")
-    os.system("pm2 save 2>/dev/null")
+    pm2_start(client, echo=True)
+    pm2_save()
     
     print(f"\n{C.GREEN}✅ {username} started in background!{C.END}")
     print(f"{C.YELLOW}Use 'pm2 logs {username}' or option [9] to view logs{C.END}")
@@ -688,7 +2559,7 @@ def stop_client():
     username = client['username']
     print(f"\n{C.CYAN}Stopping {username}...{C.END}")
     
-    os.system(f"pm2 stop {username} 2>/dev/null")
+    pm2_stop(username)
     print(f"{C.GREEN}✅ {username} stopped!{C.END}")
     pause()
 
@@ -704,7 +2575,7 @@ def restart_client():
     username = client['username']
     print(f"\n{C.CYAN}Restarting {username}...{C.END}")
     
-    os.system(f"pm2 restart {username} 2>/dev/null")
+    pm2("restart", username, client=username)
     print(f"{C.GREEN}✅ {username} restarted!{C.END}")
     pause()
 
@@ -719,19 +2590,24 @@ def start_all():
     
     print(f"\n{C.GREEN}══════════════════ START ALL BOTS ══════════════════{C.END}\n")
     
-    for client in data['clients']:
+    def start_one(client):
+        if get_status(client['username']) == 'online':
+            return None
+        return pm2_start(client)
+    
+    results = run_parallel(start_one, data['clients'])
+    
+    for client, result in zip(data['clients'], results):
         username = client['username']
-        client_dir = client['directory']
-        print(f"  Starting {username}...", end=" ", flush=True)
-        
-        status = get_status(username)
-        if status == 'online':
+        print(f"  Starting {username}...", end=" ")
+        if result is None:
             print(f"{C.YELLOW}already running{C.END}")
+        elif isinstance(result, Exception) or result["code"] != 0:
+            print(f"{C.RED}❌ failed{C.END}")
         else:
-            os.system(f"pm2 start {client_dir}/index.js --name {username} --cwd {client_dir} 2>/dev/null")
             print(f"{C.GREEN}✅{C.END}")
     
-    os.system("pm2 save 2>/dev/null")
+    pm2_save()
     print(f"\n{C.GREEN}All bots started!{C.END}")
     pause()
 
@@ -750,11 +2626,14 @@ def stop_all():
     
     print(f"\n{C.RED}══════════════════ STOPPING ALL ══════════════════{C.END}\n")
     
-    for client in data['clients']:
-        username = client['username']
-        print(f"  Stopping {username}...", end=" ", flush=True)
-        os.system(f"pm2 stop {username} 2>/dev/null")
-        print(f"{C.GREEN}✅{C.END}")
+    results = run_parallel(lambda c: pm2_stop(c['username']), data['clients'])
+    
+    for client, result in zip(data['clients'], results):
+        print(f"  Stopping {client['username']}...", end=" ")
+        if isinstance(result, Exception) or result["code"] != 0:
+            print(f"{C.RED}❌ failed{C.END}")
+        else:
+            print(f"{C.GREEN}✅{C.END}")
     
     print(f"\n{C.GREEN}All bots stopped!{C.END}")
     pause()
@@ -762,7 +2641,7 @@ def stop_all():
 def pm2_status():
     banner()
     print(f"\n{C.CYAN}══════════════════ PM2 STATUS ══════════════════{C.END}\n")
-    os.system("pm2 status")
+    pm2("status", interactive=True)
     pause()
 
 def view_logs():
@@ -778,10 +2657,7 @@ def view_logs():
     print(f"\n{C.YELLOW}Showing logs for {username} (Ctrl+C to exit){C.END}\n")
     print("═" * 60)
     
-    try:
-        os.system(f"pm2 logs {username} --lines 100")
-    except KeyboardInterrupt:
-        pass
+    pm2("logs", username, "--lines", 100, client=username, interactive=True)
 
 def run_interactive():
     """Run node index.js directly (for re-scanning QR)"""
@@ -801,7 +2677,7 @@ def run_interactive():
     status = get_status(username)
     if status == 'online':
         print(f"\n{C.YELLOW}Stopping PM2 process first...{C.END}")
-        os.system(f"pm2 stop {username} 2>/dev/null")
+        pm2_stop(username)
     
     print(f"""
 {C.GREEN}════════════════════════════════════════════════════════════════
@@ -816,14 +2692,14 @@ def run_interactive():
     input(f"{C.YELLOW}Press Enter to start...{C.END}")
     
     print("\n")
-    os.system(f"cd {client_dir} && node index.js")
+    run_cmd(["node", "index.js"], cwd=client_dir, client=username, interactive=True)
     
     print(f"\n{C.GREEN}Session ended.{C.END}")
     
     restart = input(f"\n{C.YELLOW}Start bot in background with PM2? (y/n): {C.END}")
     if restart.lower() == 'y':
-        os.system(f"pm2 start {client_dir}/index.js --name {username} --cwd {client_dir}")
-        os.system("pm2 save 2>/dev/null")
+        pm2_start(client, echo=True)
+        pm2_save()
         print(f"{C.GREEN}✅ {username} running in background!{C.END}")
     
     pause()
@@ -848,8 +2724,8 @@ def delete_client():
     print(f"\n{C.CYAN}Deleting {username}...{C.END}")
     
     # Stop and delete from PM2
-    os.system(f"pm2 stop {username} 2>/dev/null")
-    os.system(f"pm2 delete {username} 2>/dev/null")
+    pm2_stop(username)
+    pm2("delete", username, client=username)
     
     # Remove directory
     client_dir = Path(client['directory'])
@@ -864,14 +2740,65 @@ def delete_client():
     print(f"{C.GREEN}✅ {username} deleted!{C.END}")
     pause()
 
-def backup_sessions():
-    banner()
-    print(f"\n{C.CYAN}══════════════════ BACKUP SESSIONS ══════════════════{C.END}\n")
-    
+_backup_times_lock = threading.Lock()
+
+def load_backup_times():
+    try:
+        with open(BACKUP_TIMES) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def record_backup(usernames):
+    """Remember when these clients' sessions were last backed up"""
+    now = datetime.now().isoformat()
+    with _backup_times_lock:
+        times = load_backup_times()
+        times.update({u: now for u in usernames})
+        try:
+            BACKUP_TIMES.parent.mkdir(parents=True, exist_ok=True)
+            tmp = BACKUP_TIMES.with_suffix(".tmp")
+            tmp.write_text(json.dumps(times, indent=2))
+            os.replace(tmp, BACKUP_TIMES)
+        except OSError:
+            pass
+
+def backup_all_sessions(clients, report=print):
+    """Snapshot every client's preserved items into a timestamped folder.
+
+    Returns (backup_dir, {username: [items]}, stats).
+    """
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     backup_dir = BACKUP_DIR / f"sessions_{timestamp}"
     backup_dir.mkdir(parents=True, exist_ok=True)
     
+    stats = new_sync_stats()
+    results = {}
+    for client in clients:
+        username = client['username']
+        client_dir = Path(client['directory'])
+        
+        with maintenance_priority():
+            backed_up = backup_preserved_items(client_dir, backup_dir / username, stats)
+        results[username] = backed_up
+        
+        if backed_up:
+            report(f"  {C.GREEN}✅{C.END} {username} - {', '.join(backed_up)}")
+        else:
+            report(f"  {C.YELLOW}⚠️{C.END} {username} - no session found")
+    
+    # Backup config
+    if CONFIG_FILE.exists():
+        shutil.copy(CONFIG_FILE, backup_dir / "clients.json")
+        report(f"  {C.GREEN}✅{C.END} clients.json")
+    
+    record_backup([u for u, items in results.items() if items])
+    return backup_dir, results, stats
+
+def backup_sessions():
+    banner()
+    print(f"\n{C.CYAN}══════════════════ BACKUP SESSIONS ══════════════════{C.END}\n")
+    
     data = load_clients()
     
     if not data['clients']:
@@ -879,43 +2806,1439 @@ def backup_sessions():
         pause()
         return
     
-    print(f"Backup location: {backup_dir}\n")
+    print(f"Backup location: {BACKUP_DIR}/sessions_<timestamp>\n")
     
-    for client in data['clients']:
+    backup_dir, _, stats = backup_all_sessions(data['clients'])
+    
+    print(f"\n{C.GREEN}Backup complete: {backup_dir}{C.END}")
+    print(f"  {sync_summary(stats)}")
+    pause()
+
+# ═══════════════════════════════════════════════════════════════
+# CLIENT STATUS & ACTIONS
+# ═══════════════════════════════════════════════════════════════
+
+def find_client(username):
+    for client in load_clients()['clients']:
+        if client['username'] == username:
+            return client
+    return None
+
+_version_cache = {}
+
+def cached_local_version(client_dir):
+    """get_local_version(), re-read only when package.json changes"""
+    try:
+        mtime = os.stat(Path(client_dir) / "package.json").st_mtime_ns
+    except OSError:
+        mtime = None
+    cached = _version_cache.get(client_dir)
+    if cached and cached[0] == mtime and mtime is not None:
+        return cached[1]
+    version = get_local_version(client_dir)
+    _version_cache[client_dir] = (mtime, version)
+    return version
+
+def client_summary(client, processes):
+    """JSON-friendly status of one client from a pm2 snapshot"""
+    p = processes.get(client['username'], {})
+    env = p.get('pm2_env', {})
+    monit = p.get('monit', {})
+    return {
+        "username": client['username'],
+        "directory": client['directory'],
+        "status": env.get('status', 'stopped'),
+        "version": cached_local_version(client['directory']),
+        "restarts": env.get('restart_time', 0),
+        "uptime_since": env.get('pm_uptime'),
+        "cpu": monit.get('cpu', 0),
+        "memory": monit.get('memory', 0),
+        "disk_bytes": cached_disk_usage(client['directory']),
+        "crash_loop": client['username'] in _crash_loops,
+    }
+
+def client_action(client, action):
+    """start / stop / restart / update one client without prompts"""
+    username = client['username']
+    if action == "start":
+        result = pm2_start(client)
+    elif action == "stop":
+        result = pm2_stop(username)
+    elif action == "restart":
+        result = pm2("restart", username, client=username)
+    elif action == "update":
+        ok = update_single_client(client)
+        return {"client": username, "action": action, "ok": ok}
+    else:
+        raise ValueError(f"unknown action: {action}")
+    return {
+        "client": username,
+        "action": action,
+        "ok": result["code"] == 0,
+        "code": result["code"],
+        "duration": result["duration"],
+        "output": tail_lines(result["output"], 10),
+    }
+
+# ═══════════════════════════════════════════════════════════════
+# DISK USAGE
+# ═══════════════════════════════════════════════════════════════
+
+_disk_index = None
+_disk_index_dirty = False
+_disk_lock = threading.Lock()
+_disk_usage = {}
+
+def _load_disk_index():
+    global _disk_index
+    if _disk_index is None:
+        try:
+            _disk_index = json.loads(DISK_INDEX.read_text())
+        except (OSError, ValueError):
+            _disk_index = {}
+    return _disk_index
+
+def save_disk_index():
+    global _disk_index_dirty
+    with _disk_lock:
+        if not _disk_index_dirty:
+            return
+        DISK_INDEX.parent.mkdir(parents=True, exist_ok=True)
+        tmp = DISK_INDEX.with_suffix(".tmp")
+        tmp.write_text(json.dumps(_disk_index, separators=(",", ":")))
+        os.replace(tmp, DISK_INDEX)
+        _disk_index_dirty = False
+
+def _scan_tree(top, rel, old, new, stats):
+    """Bytes under top/rel. Directories found in `old` with the same mtime
+    are not listed again; pass old=None to list everything."""
+    total = 0
+    stack = [rel]
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(top, rel)
+        try:
+            mtime = os.lstat(path).st_mtime_ns
+        except OSError:
+            continue
+        entry = old.get(rel) if old is not None else None
+        if entry is None or entry[0] != mtime:
+            own, dirs = 0, []
+            try:
+                with os.scandir(path) as it:
+                    for e in it:
+                        try:
+                            if e.is_dir(follow_symlinks=False):
+                                dirs.append(e.name)
+                            else:
+                                own += e.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            pass
+            except OSError:
+                continue
+            entry = [mtime, own, dirs]
+            stats["scanned"] += 1
+        else:
+            stats["reused"] += 1
+        if new is not None:
+            new[rel] = entry
+        total += entry[1]
+        stack.extend(os.path.join(rel, d) for d in entry[2])
+    return total
+
+def client_disk_usage(client_dir, full=False):
+    """{"total", "items": {top-level name: bytes}, "scanned", "reused"}"""
+    global _disk_index_dirty
+    client_dir = str(client_dir)
+    stats = {"scanned": 0, "reused": 0}
+    items = {}
+    
+    with _disk_lock:
+        cached = _load_disk_index().get(client_dir, {})
+    full = full or time.time() - cached.get("full_scan_at", 0) > DISK_FULL_RESCAN_HOURS * 3600
+    old = {} if full else cached.get("dirs", {})
+    new = {}
+    
+    try:
+        entries = list(os.scandir(client_dir))
+    except OSError:
+        entries = []
+    for e in entries:
+        try:
+            if e.is_dir(follow_symlinks=False):
+                static = e.name in DISK_STATIC_ITEMS
+                items[e.name] = _scan_tree(client_dir, e.name, old if static else None,
+                                           new if static else None, stats)
+            else:
+                items[e.name] = e.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+    
+    with _disk_lock:
+        _load_disk_index()[client_dir] = {
+            "full_scan_at": time.time() if full else cached.get("full_scan_at", 0),
+            "dirs": new,
+        }
+        _disk_index_dirty = True
+    
+    return {"total": sum(items.values()), "items": items, **stats}
+
+def cached_disk_usage(client_dir):
+    """Bytes under client_dir, rescanned at most every DISK_USAGE_REFRESH s.
+
+    Only updates the in-memory index; callers save_disk_index() once per pass.
+    """
+    now = time.monotonic()
+    cached = _disk_usage.get(client_dir)
+    if cached and now - cached[0] < DISK_USAGE_REFRESH:
+        return cached[1]
+    size = client_disk_usage(client_dir)["total"]
+    _disk_usage[client_dir] = (now, size)
+    return size
+
+def pm2_log_bytes(proc):
+    total = 0
+    env = proc.get('pm2_env', {})
+    for key in ("pm_out_log_path", "pm_err_log_path"):
+        try:
+            total += os.path.getsize(env[key])
+        except (KeyError, OSError):
+            pass
+    return total
+
+def prune_plan(client_dir):
+    """[(item, item_bytes, [(path, size)])] of files PRUNE_RULES would delete"""
+    plan = []
+    now = time.time()
+    for item, days, min_mb in PRUNE_RULES:
+        path = Path(client_dir) / item
+        if not path.is_dir() or path.is_symlink():
+            continue
+        item_bytes = 0
+        victims = []
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                file = os.path.join(root, name)
+                try:
+                    st = os.lstat(file)
+                except OSError:
+                    continue
+                item_bytes += st.st_size
+                if now - st.st_mtime >= days * 86400:
+                    victims.append((file, st.st_size))
+        if victims and item_bytes >= min_mb * 1024 * 1024:
+            plan.append((item, item_bytes, victims))
+    return plan
+
+def prune_client(client_dir, plan=None):
+    """Delete what prune_plan selected; returns bytes freed"""
+    plan = prune_plan(client_dir) if plan is None else plan
+    freed = 0
+    for item, _, victims in plan:
+        for file, size in victims:
+            try:
+                os.unlink(file)
+                freed += size
+            except OSError:
+                pass
+        # Drop directories the deletions emptied, but keep the item itself
+        top = Path(client_dir) / item
+        for root, dirs, files in os.walk(top, topdown=False):
+            if Path(root) != top and not os.listdir(root):
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+    _disk_usage.pop(str(client_dir), None)
+    return freed
+
+def disk_usage_rows(clients=None, full=False):
+    """Per-client usage rows, largest first"""
+    clients = load_clients()['clients'] if clients is None else clients
+    processes = pm2_processes()
+    
+    def row(client):
+        usage = client_disk_usage(client['directory'], full)
+        items = usage["items"]
+        return {
+            "username": client['username'],
+            "total": usage["total"],
+            "node_modules": items.get("node_modules", 0),
+            "data": sum(items.get(i, 0) for i in PRESERVE_ITEMS),
+            "prunable": sum(sum(size for _, size in victims)
+                            for _, _, victims in prune_plan(client['directory'])),
+            "pm2_logs": pm2_log_bytes(processes.get(client['username'], {})),
+            "scanned": usage["scanned"],
+            "reused": usage["reused"],
+        }
+    
+    rows = [r for r in run_parallel(row, clients, MAX_PARALLEL) if not isinstance(r, Exception)]
+    save_disk_index()
+    return sorted(rows, key=lambda r: r["total"], reverse=True)
+
+def print_disk_usage(clients=None, full=False):
+    started = time.monotonic()
+    rows = disk_usage_rows(clients, full)
+    elapsed = time.monotonic() - started
+    
+    print(f"{'Client':<20} {'Total':>10} {'node_modules':>13} {'Data':>10} {'Prunable':>10} {'PM2 logs':>10}")
+    print("─" * 78)
+    for r in rows:
+        prunable = f"{C.YELLOW}{fmt_bytes(r['prunable']):>10}{C.END}" if r['prunable'] else f"{'-':>10}"
+        print(f"{r['username']:<20} {fmt_bytes(r['total']):>10} {fmt_bytes(r['node_modules']):>13} "
+              f"{fmt_bytes(r['data']):>10} {prunable} {fmt_bytes(r['pm2_logs']):>10}")
+    print("─" * 78)
+    total = sum(r['total'] for r in rows)
+    prunable = sum(r['prunable'] for r in rows)
+    scanned = sum(r['scanned'] for r in rows)
+    reused = sum(r['reused'] for r in rows)
+    print(f"{'TOTAL':<20} {fmt_bytes(total):>10} {'':>13} {'':>10} {fmt_bytes(prunable):>10}")
+    print(f"\nScanned in {elapsed:.2f}s ({scanned} directories listed, {reused} reused from index)")
+    return rows
+
+def prune_clients(clients=None, apply=False, report=print):
+    """Show (and with apply=True delete) what PRUNE_RULES select"""
+    clients = load_clients()['clients'] if clients is None else clients
+    total = 0
+    for client in clients:
+        plan = prune_plan(client['directory'])
+        if not plan:
+            continue
+        report(f"{C.CYAN}{client['username']}{C.END}")
+        for item, item_bytes, victims in plan:
+            size = sum(s for _, s in victims)
+            report(f"  {item:<22} {len(victims):>6} files  {fmt_bytes(size):>10} of {fmt_bytes(item_bytes)}")
+        total += prune_client(client['directory'], plan) if apply else sum(
+            sum(s for _, s in victims) for _, _, victims in plan)
+    verb = "Freed" if apply else "Would free"
+    report(f"\n{C.GREEN}{verb} {fmt_bytes(total)}{C.END}")
+    return total
+
+def disk_usage():
+    """Disk usage & cleanup - menu option"""
+    banner()
+    print(f"\n{C.BLUE}═══════════════════ DISK USAGE ═══════════════════{C.END}\n")
+    
+    rows = print_disk_usage()
+    if not any(r['prunable'] for r in rows):
+        pause()
+        return
+    
+    if input(f"\n{C.YELLOW}Review prunable files? (y/n): {C.END}").lower() != 'y':
+        return
+    print()
+    prune_clients()
+    if input(f"\n{C.YELLOW}Delete these files? (y/n): {C.END}").lower() == 'y':
+        prune_clients(apply=True, report=lambda *a: None)
+        print(f"{C.GREEN}✅ Pruned{C.END}")
+    pause()
+
+# ═══════════════════════════════════════════════════════════════
+# CRASH-LOOP SUPERVISOR
+# ═══════════════════════════════════════════════════════════════
+
+_supervisor_lock = threading.Lock()
+_supervisor_thread = None
+
+def load_supervisor_state():
+    try:
+        with open(SUPERVISOR_STATE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_supervisor_state(state):
+    SUPERVISOR_STATE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = SUPERVISOR_STATE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, SUPERVISOR_STATE)
+
+def clear_backoff(username):
+    """An operator start/stop cancels the supervisor's pending restart"""
+    with _supervisor_lock:
+        state = load_supervisor_state()
+        entry = state.get(username)
+        if not entry or not entry.get("backoff_until"):
+            return
+        entry["backoff_until"] = None
+        save_supervisor_state(state)
+
+def read_tail(path, n=5, block=8192):
+    """Last n lines of a (possibly huge) log file"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - block, 0))
+            data = f.read().decode(errors="replace")
+    except OSError:
+        return []
+    return [line for line in data.splitlines() if line.strip()][-n:]
+
+def last_error_lines(proc, n=5):
+    return read_tail(proc.get('pm2_env', {}).get('pm_err_log_path', ''), n)
+
+def supervise_once(processes=None, now=None, report=None):
+    """One supervisor pass: record restart counters, back off crash loops,
+    resume clients whose backoff expired. Returns the new state."""
+    processes = pm2_processes() if processes is None else processes
+    now = time.time() if now is None else now
+    say = report or (lambda msg: None)
+    
+    with _supervisor_lock:
+        state = load_supervisor_state()
+        clients = {c['username']: c for c in load_clients()['clients']}
+        for username in list(state):
+            if username not in clients:
+                del state[username]
+        
+        for username, client in clients.items():
+            proc = processes.get(username)
+            entry = state.setdefault(username, {"samples": [], "strikes": 0, "backoff_until": None})
+            
+            if entry.get("backoff_until"):
+                if proc and proc.get('pm2_env', {}).get('status') == 'online':
+                    entry["backoff_until"] = None  # started by hand
+                elif now >= entry["backoff_until"]:
+                    pm2("restart", username, client=username)
+                    entry["backoff_until"] = None
+                    entry["samples"] = []
+                    say(f"{username}: backoff over, restarted")
+                continue
+            
+            if not proc:
+                entry["samples"] = []
+                continue
+            env = proc.get('pm2_env', {})
+            restarts = env.get('restart_time', 0)
+            samples = [s for s in entry["samples"] if now - s[0] <= CRASH_WINDOW]
+            if samples and restarts < samples[-1][1]:
+                samples = []  # counter reset (pm2 reset / re-register)
+            samples.append([now, restarts])
+            entry["samples"] = samples
+            
+            if entry.get("last_restart_count") != restarts:
+                entry["last_restart_count"] = restarts
+                entry["last_restart_at"] = now
+            elif entry["strikes"] and now - entry.get("last_restart_at", now) > CRASH_FORGIVE:
+                entry["strikes"] = 0
+            
+            recent = restarts - samples[0][1]
+            if recent >= CRASH_RESTARTS and env.get('status') != 'stopped':
+                entry["strikes"] += 1
+                delay = min(BACKOFF_BASE * 2 ** (entry["strikes"] - 1), BACKOFF_MAX)
+                pm2("stop", username, client=username)
+                entry["backoff_until"] = now + delay
+                entry["detected_at"] = now
+                entry["last_backoff"] = delay
+                entry["restarts_in_window"] = recent
+                entry["errors"] = last_error_lines(proc)
+                entry["samples"] = []
+                say(f"{username}: {recent} restarts in {CRASH_WINDOW}s, stopped for {delay}s")
+        
+        save_supervisor_state(state)
+    return state
+
+def crash_loop_report(processes=None, now=None):
+    """{username: {state, summary, errors}} for clients in or near a crash loop"""
+    processes = pm2_processes() if processes is None else processes
+    now = time.time() if now is None else now
+    offenders = {}
+    for username, entry in load_supervisor_state().items():
+        proc = processes.get(username, {})
+        status = proc.get('pm2_env', {}).get('status')
+        if entry.get("backoff_until"):
+            wait = max(entry["backoff_until"] - now, 0)
+            offenders[username] = {
+                "state": "Backoff",
+                "summary": f"{entry.get('restarts_in_window', '?')} restarts in {CRASH_WINDOW}s, "
+                           f"strike {entry['strikes']}, restarting in {wait:.0f}s",
+                "errors": entry.get("errors", []),
+            }
+        elif status == 'errored':
+            offenders[username] = {
+                "state": "Errored",
+                "summary": "PM2 gave up restarting it",
+                "errors": last_error_lines(proc),
+            }
+        elif entry.get("strikes") and status == 'online':
+            offenders[username] = {
+                "state": "Probation",
+                "summary": f"restarted after backoff (strike {entry['strikes']})",
+                "errors": last_error_lines(proc, 3),
+            }
+    return offenders
+
+def _supervisor_loop(interval, report):
+    # One supervisor per host: whoever holds the lock file does the work
+    SUPERVISOR_STATE.parent.mkdir(parents=True, exist_ok=True)
+    lock = open(SUPERVISOR_STATE.with_suffix(".lock"), 'w')
+    while True:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except OSError:
+            time.sleep(interval)
+    while True:
+        try:
+            supervise_once(report=report)
+        except Exception as e:
+            sys.stderr.write(f"[supervisor] pass failed: {e}\n")
+        time.sleep(interval)
+
+def start_supervisor(interval=SUPERVISOR_INTERVAL, report=None):
+    global _supervisor_thread
+    if _supervisor_thread and _supervisor_thread.is_alive():
+        return
+    _supervisor_thread = threading.Thread(target=_supervisor_loop, args=(interval, report),
+                                          name="supervisor", daemon=True)
+    _supervisor_thread.start()
+
+# ═══════════════════════════════════════════════════════════════
+# LOG ROTATION
+# ═══════════════════════════════════════════════════════════════
+
+LOG_SETTINGS = ("max_mb", "max_age_hours", "retain")
+_SEGMENT_SUFFIX = re.compile(r"\.\d{8}-\d{6}(-\d+)?(\.gz)?$")
+_rotate_lock = threading.Lock()
+_compress_thread = None
+_rotator_thread = None
+
+def load_log_config():
+    try:
+        with open(LOG_ROTATE_CONFIG, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+    config.setdefault("default", {})
+    config.setdefault("clients", {})
+    return config
+
+def save_log_config(config):
+    LOG_ROTATE_CONFIG.parent.mkdir(parents=True, exist_ok=True)
+    with open(LOG_ROTATE_CONFIG, 'w') as f:
+        json.dump(config, f, indent=2)
+
+def set_log_settings(settings, client=None):
+    """Store rotation settings fleet-wide (client=None) or for one client"""
+    config = load_log_config()
+    target = config["clients"].setdefault(client, {}) if client else config["default"]
+    target.update({k: settings[k] for k in LOG_SETTINGS if settings.get(k) is not None})
+    save_log_config(config)
+    return config
+
+def log_settings(username=None, config=None):
+    config = load_log_config() if config is None else config
+    settings = {"max_mb": LOG_MAX_MB, "max_age_hours": LOG_MAX_AGE_HOURS, "retain": LOG_RETAIN}
+    settings.update(config["default"])
+    settings.update(config["clients"].get(username, {}))
+    return settings
+
+def managed_logs(processes=None):
+    """[(username, path, is_pm2)] for every client's PM2 and command logs"""
+    processes = pm2_processes() if processes is None else processes
+    logs = []
+    for client in load_clients()['clients']:
         username = client['username']
-        client_dir = Path(client['directory'])
+        env = processes.get(username, {}).get('pm2_env', {})
+        for key in ("pm_out_log_path", "pm_err_log_path"):
+            if env.get(key):
+                logs.append((username, env[key], True))
+        logs.append((username, str(LOG_DIR / f"{username}.log"), False))
+    for name in ("chairman", "pool"):
+        logs.append((name, str(LOG_DIR / f"{name}.log"), False))
+    return logs
+
+def files_held_open():
+    """Paths some process still has open: this process's running commands,
+    plus whatever /proc/*/fd shows (every process when running as root)"""
+    with _active_lock:
+        held = {os.path.realpath(p) for p in _log_writers}
+    for pid in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not pid.isdigit():
+            continue
+        try:
+            fds = os.listdir(f"/proc/{pid}/fd")
+        except OSError:
+            continue
+        for fd in fds:
+            with suppress(OSError):
+                held.add(os.readlink(f"/proc/{pid}/fd/{fd}"))
+    return held
+
+def _segment_name(path, stamp):
+    """path.<stamp>, with a counter if that segment already exists"""
+    name, n = f"{path}.{stamp}", 0
+    while os.path.exists(name) or os.path.exists(name + ".gz"):
+        n += 1
+        name = f"{path}.{stamp}-{n}"
+    return name
+
+def log_segments(path):
+    """Rotated segments of a log, newest first"""
+    folder, name = os.path.split(path)
+    try:
+        entries = os.listdir(folder or ".")
+    except OSError:
+        return []
+    segments = [os.path.join(folder, e) for e in entries
+                if e.startswith(name + ".") and _SEGMENT_SUFFIX.search(e[len(name):])]
+    return sorted(segments, reverse=True)
+
+def rotate_logs(processes=None, force=False, report=None):
+    """Rename logs past their size/age cap, reopen PM2's files, compress in the background"""
+    say = report or (lambda msg: None)
+    now = time.time()
+    config = load_log_config()
+    rotated = []
+    
+    with _rotate_lock:
+        try:
+            with open(LOG_ROTATE_STATE, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
         
-        backed_up = backup_preserved_items(client_dir, backup_dir / username)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        reload_pm2 = False
+        with _active_lock:
+            writing = {os.path.realpath(p) for p in _log_writers}
+        for username, path, is_pm2 in managed_logs(processes):
+            if not is_pm2 and os.path.realpath(path) in writing:
+                continue  # a running command appends to it; next pass
+
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if not size:
+                state[path] = now
+                continue
+            settings = log_settings(username, config)
+            since = state.setdefault(path, now)
+            too_big = size >= settings["max_mb"] * 1024 * 1024
+            too_old = now - since >= settings["max_age_hours"] * 3600
+            if force or too_big or too_old:
+                # PM2 keeps writing to the renamed file until reloadLogs
+                os.rename(path, _segment_name(path, stamp))
+                state[path] = now
+                reload_pm2 = reload_pm2 or is_pm2
+                rotated.append(path)
+                say(f"{username}: rotated {os.path.basename(path)} ({fmt_bytes(size)})")
         
-        if backed_up:
-            print(f"  {C.GREEN}✅{C.END} {username} - {', '.join(backed_up)}")
+        if reload_pm2:
+            pm2("reloadLogs")
+        LOG_ROTATE_STATE.parent.mkdir(parents=True, exist_ok=True)
+        with open(LOG_ROTATE_STATE, 'w') as f:
+            json.dump(state, f)
+    
+    compress_logs_async(processes)
+    return rotated
+
+def compress_logs(processes=None):
+    """gzip rotated segments and keep only `retain` of them per log.
+
+    Segments a writer still holds open (PM2 before its reloadLogs lands,
+    a command started before the rotation) are left for a later pass.
+    """
+    config = load_log_config()
+    saved = 0
+    held = files_held_open()
+    with maintenance_priority():
+        for username, path, _ in managed_logs(processes):
+            retain = log_settings(username, config)["retain"]
+            for segment in log_segments(path):
+                if segment.endswith(".gz") or os.path.realpath(segment) in held:
+                    continue
+                tmp = segment + ".gz.tmp"
+                try:
+                    with open(segment, 'rb') as fin, gzip.open(tmp, 'wb', compresslevel=6) as fout:
+                        shutil.copyfileobj(fin, fout, COPY_CHUNK)
+                    saved += os.path.getsize(segment) - os.path.getsize(tmp)
+                    os.replace(tmp, segment + ".gz")
+                    os.unlink(segment)
+                except OSError:
+                    with suppress(OSError):
+                        os.unlink(tmp)
+            for old in log_segments(path)[retain:]:
+                if os.path.realpath(old) not in held:
+                    with suppress(OSError):
+                        os.unlink(old)
+    return saved
+
+def compress_logs_async(processes=None):
+    global _compress_thread
+    if _compress_thread and _compress_thread.is_alive():
+        return _compress_thread
+    _compress_thread = threading.Thread(target=compress_logs, args=(processes,), name="log-compress", daemon=True)
+    _compress_thread.start()
+    return _compress_thread
+
+def log_status(processes=None):
+    """[{username, file, bytes, segments, segment_bytes}] per managed log"""
+    rows = []
+    for username, path, is_pm2 in managed_logs(processes):
+        segments = log_segments(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        rows.append({
+            "username": username,
+            "file": path,
+            "pm2": is_pm2,
+            "bytes": size,
+            "segments": len(segments),
+            "segment_bytes": sum(os.path.getsize(s) for s in segments if os.path.exists(s)),
+        })
+    return rows
+
+def print_log_status(processes=None):
+    config = load_log_config()
+    defaults = log_settings(None, config)
+    print(f"Fleet default: rotate at {defaults['max_mb']} MB or {defaults['max_age_hours']} h, "
+          f"keep {defaults['retain']} compressed segments")
+    for username, overrides in config["clients"].items():
+        print(f"  {username}: {overrides}")
+    print(f"\n{'Client':<20} {'Log':<28} {'Current':>10} {'Segments':>9} {'Archived':>10}")
+    print("─" * 80)
+    for row in log_status(processes):
+        print(f"{row['username']:<20} {os.path.basename(row['file'])[:28]:<28} {fmt_bytes(row['bytes']):>10} "
+              f"{row['segments']:>9} {fmt_bytes(row['segment_bytes']):>10}")
+    print("─" * 80)
+
+def _rotator_loop(interval, report):
+    while True:
+        try:
+            rotate_logs(report=report)
+        except Exception as e:
+            sys.stderr.write(f"[logs] rotation failed: {e}\n")
+        time.sleep(interval)
+
+def start_log_rotator(interval=LOG_ROTATE_INTERVAL, report=None):
+    global _rotator_thread
+    if _rotator_thread and _rotator_thread.is_alive():
+        return
+    _rotator_thread = threading.Thread(target=_rotator_loop, args=(interval, report),
+                                       name="log-rotator", daemon=True)
+    _rotator_thread.start()
+
+# ═══════════════════════════════════════════════════════════════
+# FLEET STATE CACHE
+# ═══════════════════════════════════════════════════════════════
+
+_fleet_cache = {"clients": [], "refreshed_at": None, "refreshed_mono": 0.0, "refresh_seconds": 0.0}
+_remote_version = {"version": "unknown", "checked_mono": None}
+_cache_lock = threading.Lock()
+_cache_wakeup = threading.Event()
+_cache_thread = None
+_crash_loops = {}
+
+def refresh_fleet_cache():
+    """Rebuild the snapshot from one pm2 jlist and swap it in"""
+    global _crash_loops
+    started = time.monotonic()
+    processes = pm2_processes()
+    _crash_loops = crash_loop_report(processes)
+    clients = [client_summary(c, processes) for c in load_clients()['clients']]
+    save_disk_index()
+    
+    snapshot = {
+        "clients": clients,
+        "refreshed_at": datetime.now().isoformat(),
+        "refreshed_mono": time.monotonic(),
+        "refresh_seconds": round(time.monotonic() - started, 3),
+    }
+    with _cache_lock:
+        _fleet_cache.update(snapshot)
+    return snapshot
+
+def _cache_loop(interval):
+    while True:
+        try:
+            refresh_fleet_cache()
+            checked = _remote_version["checked_mono"]
+            if checked is None or time.monotonic() - checked > REMOTE_VERSION_REFRESH:
+                _remote_version["version"] = get_remote_version()
+                _remote_version["checked_mono"] = time.monotonic()
+        except Exception as e:
+            sys.stderr.write(f"[cache] refresh failed: {e}\n")
+        _cache_wakeup.wait(interval)
+        _cache_wakeup.clear()
+
+def start_fleet_cache(interval=CACHE_REFRESH):
+    global _cache_thread
+    if _cache_thread and _cache_thread.is_alive():
+        return
+    _cache_thread = threading.Thread(target=_cache_loop, args=(interval,), name="fleet-cache", daemon=True)
+    _cache_thread.start()
+
+def invalidate_fleet_cache():
+    """Ask the background thread to refresh now (after an operation)"""
+    _cache_wakeup.set()
+
+def fleet_snapshot():
+    """Current snapshot; built synchronously if the cache never ran"""
+    with _cache_lock:
+        if _fleet_cache["refreshed_at"] is not None:
+            snapshot = dict(_fleet_cache)
+            snapshot["age"] = round(time.monotonic() - snapshot.pop("refreshed_mono"), 3)
+            return snapshot
+    refresh_fleet_cache()
+    return fleet_snapshot()
+
+# ═══════════════════════════════════════════════════════════════
+# PROMETHEUS METRICS
+# ═══════════════════════════════════════════════════════════════
+
+_update_durations = {"offset": 0, "inode": None, "clients": {}}
+_update_durations_lock = threading.Lock()
+
+def last_update_durations():
+    """{client: seconds} of the latest successful update, tailing STAGE_LOG"""
+    with _update_durations_lock:
+        try:
+            st = os.stat(STAGE_LOG)
+        except OSError:
+            return dict(_update_durations["clients"])
+        if st.st_ino != _update_durations["inode"] or st.st_size < _update_durations["offset"]:
+            _update_durations.update(offset=0, inode=st.st_ino, clients={})
+        with open(STAGE_LOG) as f:
+            f.seek(_update_durations["offset"])
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                _update_durations["offset"] += len(line.encode())
+                try:
+                    run = json.loads(line)
+                except ValueError:
+                    continue
+                if run.get("ok"):
+                    _update_durations["clients"][run["client"]] = run.get("seconds", 0)
+        return dict(_update_durations["clients"])
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+METRICS = [
+    # name, type, help
+    ("chairman_client_up", "gauge", "1 if the PM2 process is online"),
+    ("chairman_client_restarts_total", "counter", "PM2 restart counter"),
+    ("chairman_client_uptime_seconds", "gauge", "Seconds since the process (re)started, 0 when not online"),
+    ("chairman_client_cpu_percent", "gauge", "CPU usage reported by PM2"),
+    ("chairman_client_memory_rss_bytes", "gauge", "Resident memory reported by PM2"),
+    ("chairman_client_info", "gauge", "Installed bot version (always 1)"),
+    ("chairman_client_disk_bytes", "gauge", "Disk used by the client directory"),
+    ("chairman_client_last_backup_age_seconds", "gauge", "Seconds since the last session backup"),
+    ("chairman_client_last_update_duration_seconds", "gauge", "Duration of the last successful update"),
+    ("chairman_client_crash_loop", "gauge", "1 while the client is backed off, errored or on probation"),
+]
+
+def render_metrics():
+    """Prometheus text exposition built from one fleet snapshot"""
+    started = time.monotonic()
+    snap = fleet_snapshot()
+    backups = load_backup_times()
+    updates = last_update_durations()
+    now = datetime.now()
+    now_ms = time.time() * 1000
+    
+    samples = {name: [] for name, _, _ in METRICS}
+    for c in snap["clients"]:
+        user = _label(c["username"])
+        online = c["status"] == "online"
+        samples["chairman_client_up"].append((f'client="{user}"', int(online)))
+        samples["chairman_client_restarts_total"].append((f'client="{user}"', c["restarts"] or 0))
+        uptime = (now_ms - c["uptime_since"]) / 1000 if online and c["uptime_since"] else 0
+        samples["chairman_client_uptime_seconds"].append((f'client="{user}"', round(max(uptime, 0), 1)))
+        samples["chairman_client_cpu_percent"].append((f'client="{user}"', c["cpu"] or 0))
+        samples["chairman_client_memory_rss_bytes"].append((f'client="{user}"', c["memory"] or 0))
+        samples["chairman_client_info"].append((f'client="{user}",version="{_label(c["version"])}"', 1))
+        samples["chairman_client_disk_bytes"].append((f'client="{user}"', c.get("disk_bytes", 0)))
+        samples["chairman_client_crash_loop"].append((f'client="{user}"', int(c.get("crash_loop", False))))
+        if c["username"] in backups:
+            try:
+                age = (now - datetime.fromisoformat(backups[c["username"]])).total_seconds()
+                samples["chairman_client_last_backup_age_seconds"].append((f'client="{user}"', round(age)))
+            except ValueError:
+                pass
+        if c["username"] in updates:
+            samples["chairman_client_last_update_duration_seconds"].append((f'client="{user}"', updates[c["username"]]))
+    
+    lines = []
+    for name, kind, help_text in METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples[name])
+    lines.append("# HELP chairman_clients Registered clients")
+    lines.append("# TYPE chairman_clients gauge")
+    lines.append(f"chairman_clients {len(snap['clients'])}")
+    lines.append("# HELP chairman_snapshot_age_seconds Age of the pm2 snapshot behind these metrics")
+    lines.append("# TYPE chairman_snapshot_age_seconds gauge")
+    lines.append(f"chairman_snapshot_age_seconds {snap['age']}")
+    lines.append("# HELP chairman_scrape_duration_seconds Time spent rendering these metrics")
+    lines.append("# TYPE chairman_scrape_duration_seconds gauge")
+    lines.append(f"chairman_scrape_duration_seconds {time.monotonic() - started:.4f}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics_textfile(path):
+    """Atomically write metrics for node_exporter's textfile collector"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(render_metrics())
+    os.replace(tmp, path)
+
+# ═══════════════════════════════════════════════════════════════
+# AGENT HTTP API
+# ═══════════════════════════════════════════════════════════════
+
+AGENT_ACTIONS = ("start", "stop", "restart", "update")
+
+def agent_dispatch(method, path, body):
+    """Route one agent / API call; returns (http_status, payload).
+
+    Reads come from the fleet cache. Every route is also served under
+    /api/ (e.g. /api/clients?status=online).
+    """
+    url = urllib.parse.urlsplit(path)
+    query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+    parts = [p for p in url.path.split('/') if p]
+    if parts[:1] == ["api"]:
+        parts = parts[1:]
+    
+    if method == "GET" and parts in (["status"], ["clients"]):
+        snap = fleet_snapshot()
+        clients = snap["clients"]
+        if query.get("status"):
+            clients = [c for c in clients if c["status"] == query["status"]]
+        if query.get("version"):
+            clients = [c for c in clients if c["version"] == query["version"]]
+        counts = {}
+        for c in snap["clients"]:
+            counts[c["status"]] = counts.get(c["status"], 0) + 1
+        return 200, {
+            "host": socket.gethostname(),
+            "refreshed_at": snap["refreshed_at"],
+            "age": snap["age"],
+            "total": len(snap["clients"]),
+            "counts": counts,
+            "clients": clients,
+        }
+    
+    if method == "GET" and len(parts) == 2 and parts[0] == "clients":
+        for c in fleet_snapshot()["clients"]:
+            if c["username"] == parts[1]:
+                return 200, c
+        return 404, {"error": f"unknown client {parts[1]}"}
+    
+    if method == "GET" and parts == ["versions"]:
+        snap = fleet_snapshot()
+        latest = _remote_version["version"]
+        versions = {c["username"]: c["version"] for c in snap["clients"]}
+        return 200, {
+            "latest": latest,
+            "clients": versions,
+            "outdated": sorted(u for u, v in versions.items() if latest != "unknown" and v != latest),
+            "age": snap["age"],
+        }
+    
+    if method == "GET" and parts == ["resources"]:
+        snap = fleet_snapshot()
+        clients = [
+            {k: c[k] for k in ("username", "status", "cpu", "memory", "restarts", "uptime_since")}
+            for c in snap["clients"]
+        ]
+        return 200, {
+            "total_cpu": round(sum(c["cpu"] for c in clients), 1),
+            "total_memory": sum(c["memory"] for c in clients),
+            "clients": sorted(clients, key=lambda c: c["memory"], reverse=True),
+            "age": snap["age"],
+        }
+    
+    if method == "POST" and len(parts) == 3 and parts[0] == "clients" and parts[2] in AGENT_ACTIONS:
+        client = find_client(parts[1])
+        if not client:
+            return 404, {"error": f"unknown client {parts[1]}"}
+        result = client_action(client, parts[2])
+        if parts[2] in ("start", "update"):
+            pm2_save()
+        invalidate_fleet_cache()
+        return 200, result
+    
+    if method == "POST" and len(parts) == 2 and parts[0] == "bulk" and parts[1] in AGENT_ACTIONS:
+        wanted = set(body.get("clients") or [])
+        clients = [c for c in load_clients()['clients'] if not wanted or c['username'] in wanted]
+        if parts[1] == "update":
+            # One at a time per host: updates are disk-bound
+            results = [client_action(c, "update") for c in clients]
         else:
-            print(f"  {C.YELLOW}⚠️{C.END} {username} - no session found")
+            results = run_parallel(lambda c: client_action(c, parts[1]), clients)
+            results = [r if not isinstance(r, Exception) else {"ok": False, "error": str(r)} for r in results]
+        pm2_save()
+        invalidate_fleet_cache()
+        return 200, {"host": socket.gethostname(), "results": results}
     
-    # Backup config
-    if CONFIG_FILE.exists():
-        shutil.copy(CONFIG_FILE, backup_dir / "clients.json")
-        print(f"  {C.GREEN}✅{C.END} clients.json")
+    if method == "POST" and parts == ["backup"]:
+        backup_dir, results, stats = backup_all_sessions(load_clients()['clients'], report=lambda line: None)
+        return 200, {"backup_dir": str(backup_dir), "clients": results, "stats": stats}
     
-    print(f"\n{C.GREEN}Backup complete: {backup_dir}{C.END}")
+    if method == "GET" and parts == ["logs"]:
+        return 200, {"settings": load_log_config(), "logs": log_status()}
+    
+    if method == "POST" and parts == ["logs", "rotate"]:
+        return 200, {"rotated": rotate_logs(force=bool(body.get("force")))}
+    
+    if method == "POST" and parts == ["logs", "config"]:
+        config = set_log_settings(body, body.get("client"))
+        return 200, {"settings": config}
+    
+    return 404, {"error": f"no route for {method} {path}"}
+
+LOOPBACK_BINDS = ("127.0.0.1", "localhost", "::1")
+
+class AgentHandler(BaseHTTPRequestHandler):
+    token = None
+    loopback = True
+    dispatch = staticmethod(agent_dispatch)
+    
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", f"max-age={CACHE_REFRESH}")
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _handle(self, method):
+        authorized = not self.token or self.headers.get("Authorization") == f"Bearer {self.token}"
+        if method == "GET" and self.path.split('?')[0] == "/metrics" and (authorized or self.loopback):
+            # Open on loopback for a local Prometheus; elsewhere scrape with a bearer token
+            return self._reply_metrics()
+        if not authorized:
+            return self._reply(401, {"error": "unauthorized"})
+        body = {}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                return self._reply(400, {"error": "invalid JSON body"})
+        try:
+            status, payload = self.dispatch(method, self.path, body)
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        self._reply(status, payload)
+    
+    def _reply_metrics(self):
+        try:
+            body, status = render_metrics().encode(), 200
+        except Exception as e:
+            body, status = f"# error: {e}\n".encode(), 500
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        self._handle("GET")
+    
+    def do_POST(self):
+        self._handle("POST")
+    
+    def log_message(self, fmt, *args):
+        sys.stderr.write(f"[agent {datetime.now():%H:%M:%S}] {fmt % args}\n")
+
+def serve_agent(bind, port, token, refresh=CACHE_REFRESH):
+    """Run the agent HTTP API until interrupted"""
+    if not token and bind not in LOOPBACK_BINDS:
+        print(f"{C.RED}❌ Refusing to listen on {bind} without --token / CHAIRMAN_TOKEN{C.END}")
+        return 1
+    AgentHandler.token = token
+    AgentHandler.loopback = bind in LOOPBACK_BINDS
+    start_fleet_cache(refresh)
+    start_supervisor()
+    start_job_worker()
+    start_log_rotator()
+    server = ThreadingHTTPServer((bind, port), AgentHandler)
+    print(f"{C.GREEN}Agent listening on http://{bind}:{port} ({CONFIG_FILE}){C.END}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+# ═══════════════════════════════════════════════════════════════
+# CONTROLLER
+# ═══════════════════════════════════════════════════════════════
+
+def load_hosts():
+    if HOSTS_FILE.exists():
+        with open(HOSTS_FILE, 'r') as f:
+            return json.load(f)
+    return {"hosts": []}
+
+def agent_request(host, method, path, body=None, timeout=AGENT_TIMEOUT):
+    """Call one agent; returns (ok, payload)"""
+    data = json.dumps(body or {}).encode() if method == "POST" else None
+    req = urllib.request.Request(host['url'].rstrip('/') + path, data=data, method=method)
+    req.add_header("Content-Type", "application/json")
+    if host.get('token'):
+        req.add_header("Authorization", f"Bearer {host['token']}")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return True, json.loads(response.read().decode())
+    except urllib.error.HTTPError as e:
+        try:
+            return False, json.loads(e.read().decode())
+        except ValueError:
+            return False, {"error": f"HTTP {e.code}"}
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        return False, {"error": str(getattr(e, 'reason', e))}
+
+def fleet_call(method, path, body=None, hosts=None, timeout=AGENT_TIMEOUT):
+    """Fan one call out to every host in parallel: [(host, ok, payload)]"""
+    hosts = hosts if hosts is not None else load_hosts()['hosts']
+    results = run_parallel(lambda h: agent_request(h, method, path, body, timeout), hosts, workers=len(hosts) or 1)
+    return [(h, *r) if not isinstance(r, Exception) else (h, False, {"error": str(r)})
+            for h, r in zip(hosts, results)]
+
+def print_fleet_status(hosts=None):
+    total = online = 0
+    print(f"{'Host':<16} {'Client':<20} {'Status':<12} {'Version':<12}")
+    print("─" * 65)
+    for host, ok, payload in fleet_call("GET", "/status", hosts=hosts):
+        if not ok:
+            print(f"{host['name']:<16} {C.RED}unreachable: {payload.get('error')}{C.END}")
+            continue
+        for c in payload['clients']:
+            total += 1
+            if c['status'] == 'online':
+                online += 1
+                st = f"{C.GREEN}● Online{C.END}"
+            else:
+                st = f"{C.RED}● Stopped{C.END}"
+            print(f"{host['name']:<16} {c['username']:<20} {st:<22} {c['version']:<12}")
+    print("─" * 65)
+    print(f"Total: {total} clients, {online} online")
+
+def fleet_bulk(action, hosts=None, clients=None):
+    """Run a bulk action on every host in parallel and print a summary"""
+    timeout = AGENT_UPDATE_TIMEOUT if action == "update" else AGENT_TIMEOUT * 10
+    if action == "backup":
+        replies = fleet_call("POST", "/backup", hosts=hosts, timeout=timeout)
+    else:
+        replies = fleet_call("POST", f"/bulk/{action}", {"clients": clients}, hosts=hosts, timeout=timeout)
+    failed = 0
+    for host, ok, payload in replies:
+        if not ok:
+            failed += 1
+            print(f"  {C.RED}❌ {host['name']}: {payload.get('error')}{C.END}")
+        elif action == "backup":
+            print(f"  {C.GREEN}✅ {host['name']}: {len(payload['clients'])} clients → {payload['backup_dir']}{C.END}")
+        else:
+            good = sum(1 for r in payload['results'] if r.get('ok'))
+            bad = len(payload['results']) - good
+            failed += bool(bad)
+            icon = f"{C.GREEN}✅" if not bad else f"{C.YELLOW}⚠️"
+            print(f"  {icon} {host['name']}: {good} ok, {bad} failed{C.END}")
+    return failed
+
+def fleet_view():
+    """All hosts - menu option"""
+    banner()
+    print(f"\n{C.BLUE}══════════════════ FLEET (ALL HOSTS) ══════════════════{C.END}\n")
+    
+    hosts = load_hosts()['hosts']
+    if not hosts:
+        print(f"{C.YELLOW}No hosts configured. Add agents to {HOSTS_FILE}:{C.END}")
+        print('  {"hosts": [{"name": "vps1", "url": "http://10.0.0.2:8701", "token": "..."}]}')
+        pause()
+        return
+    
+    print_fleet_status(hosts)
+    
+    print(f"\n  [1] Start all  [2] Stop all  [3] Restart all  [4] Update all  [5] Backup  [0] Back")
+    choice = input(f"\n{C.YELLOW}Bulk action on every host: {C.END}").strip()
+    action = {"1": "start", "2": "stop", "3": "restart", "4": "update", "5": "backup"}.get(choice)
+    if action:
+        confirm = input(f"{C.RED}Run '{action}' on ALL {len(hosts)} hosts? (yes/no): {C.END}")
+        if confirm.lower() == 'yes':
+            print()
+            fleet_bulk(action, hosts)
     pause()
 
 # ═══════════════════════════════════════════════════════════════
 # MAIN
 # ═══════════════════════════════════════════════════════════════
 
+def cli(argv):
+    """Non-interactive commands: chairman.py <command> [options]"""
+    global BASE_DIR, STORAGE_ROOTS, PLACEMENT_POLICY, CONFIG_FILE, BACKUP_DIR, HOSTS_FILE, LOG_DIR, COMMAND_HISTORY, STAGE_LOG, BACKUP_TIMES, DISK_INDEX, SUPERVISOR_STATE, JOBS_DB, MAINTENANCE_WINDOW
+    global MAINTENANCE_NICE, MAINTENANCE_IONICE, COPY_BANDWIDTH, LOG_ROTATE_CONFIG, LOG_ROTATE_STATE, REPO_CACHE
+    
+    parser = argparse.ArgumentParser(prog="chairman.py", description="Bot management system")
+    parser.add_argument("--config", type=Path, help=f"clients registry (default {CONFIG_FILE})")
+    parser.add_argument("--base-dir", type=Path, help=f"client directories (default {BASE_DIR})")
+    parser.add_argument("--backup-dir", type=Path, help=f"backups (default {BACKUP_DIR})")
+    parser.add_argument("--hosts", type=Path, help=f"controller host list (default {HOSTS_FILE})")
+    parser.add_argument("--storage-root", type=Path, action="append", default=[],
+                        help="extra client volume (repeatable)")
+    parser.add_argument("--placement", choices=["least-used", "least-loaded", "pinned"])
+    parser.add_argument("--nice", type=int, help=f"CPU niceness for maintenance work (default {MAINTENANCE_NICE})")
+    parser.add_argument("--ionice", help=f"idle | best-effort:<0-7> | off (default {MAINTENANCE_IONICE})")
+    parser.add_argument("--bwlimit", type=float, help="cap bulk file copies at this many MB/s")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    p = sub.add_parser("report", help="update stage timings (p50/p95)")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--client")
+    p.add_argument("--throttled", action="store_true", help="time spent in throttled maintenance work")
+    
+    p = sub.add_parser("agent", aliases=["serve"], help="serve this host's clients as an HTTP/JSON API")
+    p.add_argument("--bind", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=AGENT_PORT)
+    p.add_argument("--token", default=os.environ.get("CHAIRMAN_TOKEN"))
+    p.add_argument("--refresh", type=float, default=CACHE_REFRESH, help="seconds between pm2 snapshots")
+    
+    p = sub.add_parser("metrics", help="print Prometheus metrics or write a textfile-collector file")
+    p.add_argument("--textfile", type=Path, help="e.g. /var/lib/node_exporter/textfile/chairman.prom")
+    
+    p = sub.add_parser("jobs", help="durable fleet jobs: list, resume, rollback, schedule, worker")
+    p.add_argument("action", nargs="?", default="list",
+                   choices=["list", "resume", "rollback", "schedule", "cancel", "run", "worker"])
+    p.add_argument("--clients", help="comma-separated client names (schedule)")
+    p.add_argument("--window", help=f"HH:MM-HH:MM (default {MAINTENANCE_WINDOW})")
+    p.add_argument("--limit", type=int, default=20)
+    
+    p = sub.add_parser("logs", help="PM2 log rotation: status, rotate, config")
+    p.add_argument("action", nargs="?", default="status", choices=["status", "rotate", "config"])
+    p.add_argument("--force", action="store_true", help="rotate every non-empty log now")
+    p.add_argument("--max-mb", type=float)
+    p.add_argument("--max-age-hours", type=float)
+    p.add_argument("--retain", type=int)
+    p.add_argument("--client", help="per-client override (config)")
+    p.add_argument("--fleet", action="store_true", help="apply to every host in the hosts file")
+    
+    p = sub.add_parser("supervise", help="watch for crash loops and back off restarts (foreground)")
+    p.add_argument("--interval", type=float, default=SUPERVISOR_INTERVAL)
+    p.add_argument("--once", action="store_true", help="single pass, then exit")
+    
+    p = sub.add_parser("tag", help="add or remove client tags used by the picker")
+    p.add_argument("client")
+    p.add_argument("tags", nargs="*", help="tags to add (same as --add)")
+    p.add_argument("--add", nargs="+", default=[], metavar="TAG", help="tags to add, e.g. --add vip beta")
+    p.add_argument("--remove", nargs="+", default=[], metavar="TAG", help="tags to remove, e.g. --remove trial")
+    
+    p = sub.add_parser("find", help="search clients (same syntax as the picker)")
+    p.add_argument("query", nargs="*")
+    
+    p = sub.add_parser("plan", help="what an update would change, per client (commits, files, npm)")
+    p.add_argument("--client", help="comma-separated client names")
+    p.add_argument("--target", help="commit or ref to compare against (default: repo HEAD)")
+    p.add_argument("--files", type=int, default=15, help="files listed per group")
+    p.add_argument("--json", action="store_true")
+    
+    p = sub.add_parser("usage", help="per-client disk usage, largest first")
+    p.add_argument("--full", action="store_true", help="ignore the directory index")
+    p.add_argument("--client")
+    
+    p = sub.add_parser("prune", help="delete temp files and stale caches (dry run unless --apply)")
+    p.add_argument("--apply", action="store_true")
+    p.add_argument("--client")
+    
+    p = sub.add_parser("migrate", help="move a client to another storage root")
+    p.add_argument("client")
+    p.add_argument("dest_root", type=Path)
+    
+    p = sub.add_parser("fleet", help="controller: status or bulk action across all agents")
+    p.add_argument("action", nargs="?", default="status",
+                   choices=["status", "start", "stop", "restart", "update", "backup"])
+    p.add_argument("--only", help="comma-separated host names")
+    p.add_argument("--clients", help="comma-separated client names")
+    
+    args = parser.parse_args(argv)
+    if args.config:
+        # Keep logs and records next to a non-default registry
+        CONFIG_FILE = args.config
+        LOG_DIR = CONFIG_FILE.parent / "logs"
+        COMMAND_HISTORY = CONFIG_FILE.parent / "commands.jsonl"
+        STAGE_LOG = CONFIG_FILE.parent / "update_stages.jsonl"
+        HOSTS_FILE = CONFIG_FILE.parent / "hosts.json"
+        BACKUP_TIMES = CONFIG_FILE.parent / "last_backup.json"
+        DISK_INDEX = CONFIG_FILE.parent / "disk_index.json"
+        SUPERVISOR_STATE = CONFIG_FILE.parent / "supervisor.json"
+        JOBS_DB = CONFIG_FILE.parent / "jobs.db"
+        LOG_ROTATE_CONFIG = CONFIG_FILE.parent / "logrotate.json"
+        LOG_ROTATE_STATE = CONFIG_FILE.parent / "logrotate_state.json"
+        REPO_CACHE = CONFIG_FILE.parent / "repo-cache.git"
+    BASE_DIR = args.base_dir or BASE_DIR
+    STORAGE_ROOTS = STORAGE_ROOTS + args.storage_root
+    PLACEMENT_POLICY = args.placement or PLACEMENT_POLICY
+    MAINTENANCE_NICE = MAINTENANCE_NICE if args.nice is None else args.nice
+    MAINTENANCE_IONICE = args.ionice or MAINTENANCE_IONICE
+    COPY_BANDWIDTH = COPY_BANDWIDTH if args.bwlimit is None else args.bwlimit
+    BACKUP_DIR = args.backup_dir or BACKUP_DIR
+    HOSTS_FILE = args.hosts or HOSTS_FILE
+    
+    if args.command == "report":
+        if args.throttled:
+            print_throttle_report(args.days, args.client)
+        else:
+            print_stage_report(args.days, args.client)
+    elif args.command in ("agent", "serve"):
+        BASE_DIR.mkdir(parents=True, exist_ok=True)
+        BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+        return serve_agent(args.bind, args.port, args.token, args.refresh)
+    elif args.command == "metrics":
+        if args.textfile:
+            write_metrics_textfile(args.textfile)
+        else:
+            sys.stdout.write(render_metrics())
+    elif args.command == "jobs":
+        MAINTENANCE_WINDOW = args.window or MAINTENANCE_WINDOW
+        if args.action == "list":
+            print_jobs(list_jobs(args.limit))
+        elif args.action in ("resume", "rollback"):
+            ok, failed = resume_jobs(rollback=args.action == "rollback")
+            print(f"{ok} done, {failed} failed")
+            return 1 if failed else 0
+        elif args.action == "schedule":
+            clients = load_clients()['clients']
+            if args.clients:
+                names = set(args.clients.split(','))
+                clients = [c for c in clients if c['username'] in names]
+            ids, (start, end) = schedule_updates(clients)
+            print(f"Scheduled {len(ids)} update(s) for {datetime.fromtimestamp(start):%Y-%m-%d %H:%M}"
+                  f" - {datetime.fromtimestamp(end):%H:%M}")
+        elif args.action == "cancel":
+            print(f"Cancelled {cancel_jobs()} scheduled job(s)")
+        elif args.action == "run":
+            run_due_jobs()
+        else:
+            start_job_worker()
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+    elif args.command == "logs":
+        settings = {"max_mb": args.max_mb, "max_age_hours": args.max_age_hours, "retain": args.retain}
+        if args.fleet:
+            if args.action == "config":
+                replies = fleet_call("POST", "/logs/config", dict(settings, client=args.client))
+            else:
+                replies = fleet_call("POST", "/logs/rotate", {"force": args.force})
+            for host, ok, payload in replies:
+                icon = f"{C.GREEN}✅" if ok else f"{C.RED}❌"
+                print(f"  {icon} {host['name']}{C.END} {'' if ok else payload.get('error')}")
+            return 0 if all(ok for _, ok, _ in replies) else 1
+        if args.action == "config":
+            set_log_settings(settings, args.client)
+            print_log_status()
+        elif args.action == "rotate":
+            rotated = rotate_logs(force=args.force, report=print)
+            compress_logs_async().join()
+            print(f"{len(rotated)} log(s) rotated")
+        else:
+            print_log_status()
+    elif args.command == "supervise":
+        say = lambda msg: print(f"[{datetime.now():%H:%M:%S}] {msg}", flush=True)
+        if args.once:
+            supervise_once(report=say)
+        else:
+            start_supervisor(args.interval, say)
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+    elif args.command == "tag":
+        data = load_clients()
+        client = next((c for c in data['clients'] if c['username'] == args.client), None)
+        if not client:
+            print(f"{C.RED}❌ Unknown client {args.client}{C.END}")
+            return 1
+        if not (args.tags or args.add or args.remove):
+            print(f"{C.RED}❌ Nothing to do: give tags to add, --add or --remove{C.END}")
+            return 1
+        tags = set(client.get('tags', [])) | set(args.tags) | set(args.add)
+        client['tags'] = sorted(tags - set(args.remove))
+        save_clients(data)
+        print(f"{client['username']}: {' '.join(client['tags']) or '(no tags)'}")
+    elif args.command == "find":
+        statuses = cached_statuses()
+        for client in search_clients(" ".join(args.query), statuses):
+            print(f"{client['username']:<20} {statuses.get(client['username'], 'stopped'):<10} "
+                  f"{cached_local_version(client['directory']):<10} {' '.join(client.get('tags', []))}")
+    elif args.command == "plan":
+        clients = load_clients()['clients']
+        if args.client:
+            names = set(args.client.split(','))
+            clients = [c for c in clients if c['username'] in names]
+        plan = plan_release(clients, args.target)
+        if "error" in plan:
+            print(f"{C.RED}❌ {plan['error']}{C.END}")
+            return 1
+        if args.json:
+            print(json.dumps(plan, indent=2))
+        else:
+            print_release_plan(plan, args.files)
+    elif args.command in ("usage", "prune"):
+        clients = load_clients()['clients']
+        if args.client:
+            clients = [c for c in clients if c['username'] == args.client]
+        if args.command == "usage":
+            print_disk_usage(clients, args.full)
+        else:
+            prune_clients(clients, args.apply)
+    elif args.command == "migrate":
+        client = find_client(args.client)
+        if not client:
+            print(f"{C.RED}❌ Unknown client {args.client}{C.END}")
+            return 1
+        return 0 if migrate_client(client, args.dest_root) is not None else 1
+    elif args.command == "fleet":
+        hosts = load_hosts()['hosts']
+        if args.only:
+            names = set(args.only.split(','))
+            hosts = [h for h in hosts if h['name'] in names]
+        if args.action == "status":
+            print_fleet_status(hosts)
+        else:
+            clients = args.clients.split(',') if args.clients else None
+            return 1 if fleet_bulk(args.action, hosts, clients) else 0
+    return 0
+
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
+    
     # Setup
     BASE_DIR.mkdir(parents=True, exist_ok=True)
     BACKUP_DIR.mkdir(parents=True, exist_ok=True)
     
     # Check PM2
-    if os.system("which pm2 > /dev/null 2>&1") != 0:
+    if not shutil.which("pm2"):
         print(f"{C.YELLOW}Installing PM2...{C.END}")
-        os.system("npm install -g pm2")
+        run_cmd(["npm", "install", "-g", "pm2"], echo=True)
     
     # Update PM2 if needed
-    os.system("pm2 update > /dev/null 2>&1")
+    pm2("update")
+    
+    # Keep spare clients ready for instant add_client
+    refill_pool_async()
+    start_supervisor()
+    start_log_rotator()
+    
+    interrupted = interrupted_jobs()
+    if interrupted:
+        print(f"{C.YELLOW}⚠️  {len(interrupted)} interrupted job(s) found - resume or roll back with [21]{C.END}")
+        pause()
     
     actions = {
         '1': add_client,
@@ -933,6 +4256,12 @@ def main():
         '13': update_client,
         '14': update_all_clients,
         '15': check_updates,
+        '16': update_report,
+        '17': pool_status,
+        '18': fleet_view,
+        '19': storage_volumes,
+        '20': disk_usage,
+        '21': jobs_menu,
     }
     
     while True:
@@ -946,6 +4275,7 @@ def main():
                 print(f"\n{C.GREEN}Goodbye! 👋{C.END}\n")
                 sys.exit(0)
             elif choice in actions:
+                reset_cancel()
                 actions[choice]()
             else:
                 print(f"{C.RED}Invalid option!{C.END}")
@@ -0,0 +1,112 @@
+"""A hung AI provider must be judged a failure, not excused by the turn budget"""
+
+import sys
+import json
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    import aicustomer
+except ImportError as e:  # requests not installed
+    aicustomer = None
+    IMPORT_ERROR = str(e)
+
+
+class ProviderHandler(BaseHTTPRequestHandler):
+    released = threading.Event()
+
+    def do_GET(self):
+        if self.path.startswith("/hung"):
+            # Never answers within a turn
+            self.released.wait(30)
+            return
+        if self.path.startswith("/slow"):
+            # Answers, but only after the hedge delay, so the hung one is tried too
+            time.sleep(0.2)
+        body = json.dumps({"result": "Fast answer."}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(aicustomer is None, "aicustomer needs requests")
+class HungProviderTest(unittest.TestCase):
+
+    def setUp(self):
+        ProviderHandler.released.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ProviderHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{self.server.server_port}"
+
+        self.saved = dict(aicustomer.CONFIG)
+        aicustomer.CONFIG.update({
+            "ai_hedge_delay": 0.1,
+            "ai_latency_budget": 0.6,
+            "ai_request_timeout": 20,  # longer than the budget, as in the defaults
+            "ai_min_judged_wait": 0.1,
+            "ai_breaker_failures": 3,
+            "ai_breaker_cooldown": 60,
+        })
+        # Hung provider listed first, so it is tried first until it is judged
+        self.brain = aicustomer.AIBrain.__new__(aicustomer.AIBrain)
+        self.brain.router = aicustomer.ProviderRouter([
+            {"name": "hung", "url": base + "/hung?q={}", "response_key": "result"},
+            {"name": "fast", "url": base + "/fast?q={}", "response_key": "result"},
+        ])
+        self.base = base
+
+    def tearDown(self):
+        ProviderHandler.released.set()
+        self.server.shutdown()
+        self.server.server_close()
+        aicustomer.CONFIG.clear()
+        aicustomer.CONFIG.update(self.saved)
+        aicustomer.AI_SESSIONS.close()
+
+    def wait_for_failures(self, count):
+        # The hung provider's thread outlives the turn; its outcome lands at the deadline
+        health = self.brain.router.health["hung"]
+        limit = time.monotonic() + 5
+        while health["failures"] < count and time.monotonic() < limit:
+            time.sleep(0.02)
+        return health["failures"]
+
+    def test_hung_provider_opens_breaker(self):
+        self.brain.router.apis[1]["url"] = self.base + "/slow?q={}"
+        for turn in range(3):
+            self.assertEqual(self.brain._call_ai_api("hello"), "Fast answer.")
+            self.assertEqual(self.wait_for_failures(turn + 1), turn + 1)
+
+        health = self.brain.router.health["hung"]
+        self.assertEqual(health["state"], "open")
+        self.assertIn("Timeout", health["last_error"])
+        self.assertEqual([api["name"] for api in self.brain.router.order()], ["fast"])
+
+    def test_hung_provider_drops_in_order(self):
+        self.brain._call_ai_api("hello")
+        self.wait_for_failures(1)
+        self.assertEqual(self.brain.router.order()[0]["name"], "fast")
+
+    def test_budget_cut_off_is_not_a_failure(self):
+        # Too little budget left to judge the provider: released, not failed
+        aicustomer.CONFIG["ai_min_judged_wait"] = 5
+        self.brain._call_ai_api("hello")
+        time.sleep(aicustomer.CONFIG["ai_latency_budget"] + 0.3)
+        health = self.brain.router.health["hung"]
+        self.assertEqual(health["failures"], 0)
+        self.assertEqual(health["state"], "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()